@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Gemini APIの共有クライアント（step1・step2で共通）
+- genai.configureとモデルの作成をプロセス内で1回にまとめ、スレッド間で共有する
+- トークンバケットでリクエスト速度を制限し、429を受けたら速度を落として成功するたびに戻す
+- 429/5xxはジッター付き指数バックオフでリトライし、実行全体のリトライ回数に上限（リトライ予算）を設ける
+- レスポンスのusage_metadataから呼び出しごとのトークン数と所要時間を段階（stage）別に集計
+"""
+import json
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from rate_limiter import TokenBucket, backoff_delay
+
+GEMINI_RATE_PER_MINUTE = 30  # Gemini APIへのリクエスト速度の上限（クォータに合わせて調整）
+GEMINI_BURST = 5  # 一度に連続して送れるリクエスト数
+GEMINI_MAX_RETRIES = 5  # 1リクエストあたりのリトライ回数
+GEMINI_RETRY_BUDGET = 20  # 実行全体で使えるリトライ回数の合計
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+MIN_RATE_FACTOR = 0.1  # 429を受けて下げる速度の下限（設定値に対する割合）
+RATE_RECOVERY_FACTOR = 0.1  # 成功するたびに戻す速度（設定値に対する割合）
+GEMINI_USAGE_FILE = 'gemini_usage.json'  # 実行ディレクトリに保存する段階別の集計
+
+RETRYABLE_EXCEPTIONS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class GeminiError(Exception):
+    """リトライしてもGemini APIの呼び出しに失敗した"""
+
+
+def is_rate_limit_error(error):
+    """クォータ超過（429）のエラーか"""
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    message = str(error)
+    return "429" in message or "Resource exhausted" in message
+
+
+def is_retryable_error(error):
+    """リトライで回復する見込みのあるエラーか"""
+    return isinstance(error, RETRYABLE_EXCEPTIONS) or is_rate_limit_error(error)
+
+
+class GeminiClient:
+    """
+    スレッドセーフなGeminiクライアント
+
+    複数スレッドから generate() を同時に呼び出して使う。速度制限とリトライ予算は
+    すべての呼び出しで共有されるため、並列数を増やしてもクォータを超えて叩き続けない。
+    """
+
+    def __init__(self, api_key, rate_per_minute=GEMINI_RATE_PER_MINUTE, burst=GEMINI_BURST,
+                 max_retries=GEMINI_MAX_RETRIES, retry_budget=GEMINI_RETRY_BUDGET):
+        genai.configure(api_key=api_key)
+        self.base_rate = rate_per_minute / 60
+        self.current_rate = self.base_rate
+        self.limiter = TokenBucket(self.base_rate, capacity=burst)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.usage = {}  # 段階ごとの集計 {stage: {'calls', 'prompt_tokens', 'output_tokens', 'total_tokens', 'seconds'}}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name, system_instruction=None):
+        """モデルを取得（同じ設定のモデルは使い回す）"""
+        key = (model_name, system_instruction)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(
+                    model_name=model_name,
+                    system_instruction=system_instruction
+                )
+            return self._models[key]
+
+    def _take_retry(self):
+        """リトライ予算を1回分消費（使い切っていればFalse）"""
+        with self._lock:
+            if self.retries >= self.retry_budget:
+                return False
+            self.retries += 1
+            return True
+
+    def _slow_down(self):
+        """429を受けたら速度を半分に落とす"""
+        with self._lock:
+            self.rate_limited += 1
+            self.current_rate = max(self.base_rate * MIN_RATE_FACTOR, self.current_rate / 2)
+            self.limiter.set_rate(self.current_rate)
+
+    def _recover(self):
+        """成功したら速度を少しずつ設定値まで戻す"""
+        with self._lock:
+            if self.current_rate < self.base_rate:
+                self.current_rate = min(self.base_rate,
+                                        self.current_rate + self.base_rate * RATE_RECOVERY_FACTOR)
+                self.limiter.set_rate(self.current_rate)
+
+    def record_usage(self, stage, response, seconds):
+        """レスポンスのトークン数と所要時間を段階別に加算"""
+        metadata = getattr(response, 'usage_metadata', None)
+        with self._lock:
+            usage = self.usage.setdefault(stage, {
+                'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'total_tokens': 0, 'seconds': 0.0,
+            })
+            usage['calls'] += 1
+            usage['seconds'] += seconds
+            if metadata is not None:
+                usage['prompt_tokens'] += getattr(metadata, 'prompt_token_count', 0) or 0
+                usage['output_tokens'] += getattr(metadata, 'candidates_token_count', 0) or 0
+                usage['total_tokens'] += getattr(metadata, 'total_token_count', 0) or 0
+
+    def generate(self, prompt, model_name, system_instruction=None, generation_config=None, label='',
+                 stream=False, stage=None):
+        """
+        generate_contentを呼び出し、レスポンスを返す
+
+        429/5xxはリトライし、リトライ回数・リトライ予算を使い切った場合はGeminiErrorを送出する。
+        それ以外のエラーはそのまま送出する。
+        streamをTrueにした場合は最初の応答が届いた時点でレスポンスを返す
+        （以降の受信中のエラーはリトライしない）。
+        stageを指定するとトークン数と所要時間（リトライの待ち時間を含む）を集計する。
+        ストリーミングの場合は受信し終えた後に呼び出し側でrecord_usage()を呼ぶ。
+        """
+        model = self.model(model_name, system_instruction)
+        started = time.monotonic()
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with self._lock:
+                self.requests += 1
+
+            try:
+                response = model.generate_content(prompt, generation_config=generation_config,
+                                                  stream=stream)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                if is_rate_limit_error(e):
+                    self._slow_down()
+                if attempt == self.max_retries:
+                    raise GeminiError(f"{self.max_retries}回リトライしても失敗しました: {e}") from e
+                if not self._take_retry():
+                    raise GeminiError(f"リトライ予算（{self.retry_budget}回）を使い切りました: {e}") from e
+
+                delay = backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, maximum=BACKOFF_MAX_SECONDS)
+                reason = "レート制限" if is_rate_limit_error(e) else "一時的なエラー"
+                print(f"  ⏳ {reason}。{delay:.1f}秒後にリトライ "
+                      f"(試行 {attempt + 1}/{self.max_retries}){label}")
+                time.sleep(delay)
+                continue
+
+            self._recover()
+            if stage is not None and not stream:
+                self.record_usage(stage, response, time.monotonic() - started)
+            return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'rate_limited': self.rate_limited,
+                'retries': self.retries,
+                'retry_budget': self.retry_budget,
+                'rate_per_minute': round(self.current_rate * 60, 1),
+            }
+
+    def print_usage_summary(self):
+        """段階別のトークン数と所要時間を表示"""
+        with self._lock:
+            usage = {stage: dict(values) for stage, values in self.usage.items()}
+        for stage, values in usage.items():
+            print(f"📊 Gemini [{stage}]: {values['calls']} 回 / "
+                  f"入力 {values['prompt_tokens']} トークン / 出力 {values['output_tokens']} トークン / "
+                  f"合計 {values['seconds']:.1f} 秒（平均 {values['seconds'] / values['calls']:.1f} 秒）")
+
+    def save_usage(self, path):
+        """段階別の集計を実行ディレクトリのJSONに保存（既存の段階の記録は残して上書き）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            saved = {}
+
+        with self._lock:
+            for stage, values in self.usage.items():
+                saved[stage] = dict(values, seconds=round(values['seconds'], 2))
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f, ensure_ascii=False, indent=2)
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_gemini_client(api_key=None):
+    """環境変数の設定に従ってプロセス内で共有するクライアントを取得"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            api_key = api_key or os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("Gemini APIキーが設定されていません。")
+            _shared_client = GeminiClient(
+                api_key,
+                rate_per_minute=float(os.getenv('GEMINI_RATE_PER_MINUTE', GEMINI_RATE_PER_MINUTE)),
+                burst=int(os.getenv('GEMINI_BURST', GEMINI_BURST)),
+                max_retries=int(os.getenv('GEMINI_MAX_RETRIES', GEMINI_MAX_RETRIES)),
+                retry_budget=int(os.getenv('GEMINI_RETRY_BUDGET', GEMINI_RETRY_BUDGET)),
+            )
+        return _shared_client
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+JSONで保存するローカルのキー・バリューキャッシュ
+- キー（任意のJSON化できる値）のハッシュをファイル名にして保存
+- 有効期限（TTL）と件数の上限を設定でき、上限を超えたら古いものから削除
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+def make_key(key_parts):
+    """キーとなる値からSHA-256のハッシュを作成"""
+    payload = json.dumps(key_parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class JsonFileCache:
+    """TTLと件数上限付きのJSONファイルキャッシュ"""
+
+    def __init__(self, cache_dir, ttl_seconds=None, max_entries=None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key_parts):
+        """キャッシュから取得（なし・期限切れの場合はNone）"""
+        path = self._path(make_key(key_parts))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry['stored_at'] > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 最終利用時刻を更新（件数上限での削除順に使用）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry['value']
+
+    def put(self, key_parts, value):
+        """キャッシュに保存し、件数上限を超えた分を削除"""
+        path = self._path(make_key(key_parts))
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'stored_at': time.time(), 'value': value}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+        if self.max_entries is not None:
+            with self._lock:
+                self._evict()
+
+    def _evict(self):
+        """件数が上限以下になるまで最終利用が古いものから削除（ロック取得済みで呼ぶ）"""
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+
+        for _, path in sorted(entries)[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
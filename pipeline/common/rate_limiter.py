@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+API呼び出し用のレート制限（トークンバケット）
+複数スレッドから共有して使う
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッター
+
+    rate_per_second の速度でトークンが補充され、最大 capacity 個まで溜まる。
+    acquire() はトークンが1つ取れるまで待機する。
+    """
+
+    def __init__(self, rate_per_second, capacity=1):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second は正の値を指定してください")
+        self.rate = rate_per_second
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """トークンが取れるまで待機し、待機した秒数を返す"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def set_rate(self, rate_per_second):
+        """補充速度を変更（レート制限を受けた時の減速などに使う）"""
+        with self._lock:
+            self._refill()
+            self.rate = max(rate_per_second, 1e-6)
+
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    """指数バックオフ（フルジッター）の待機秒数"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
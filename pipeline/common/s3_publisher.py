@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+S3へのアップロード（step4・step5・step6で共通）
+- boto3のセッションとS3クライアントをプロセス内で1つにまとめ、スレッド間で共有する
+- 大きなファイルはマルチパートで並列に転送する
+- 音声ファイルはS3のSHA-256チェックサム（ChecksumAlgorithm）付きで送り、S3側で本文を検証させる
+- S3が返すチェックサムをローカルで計算した値と照合し、同じ内容のオブジェクトがあればアップロードしない
+- 小さなオブジェクト（RSSフィードなど）は内容が変わったときだけPUTする
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+S3_BUCKET = os.getenv("S3_BUCKET_NAME", "rsspeaker-audio-files")
+S3_REGION = os.getenv("S3_REGION", "ap-southeast-2")
+S3_UPLOAD_WORKERS = 4  # 同時にアップロードするファイル数
+S3_MULTIPART_THRESHOLD_MB = 8  # これより大きいファイルはマルチパートで転送
+S3_MULTIPART_CHUNK_MB = 8
+S3_PART_CONCURRENCY = 4  # 1ファイルあたりの同時転送パート数
+HASH_BLOCK_SIZE = 1024 * 1024
+CHECKSUM_METADATA_KEY = 'sha256'
+
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.opus': 'audio/ogg',
+    '.wav': 'audio/wav',
+}
+
+
+class UploadError(Exception):
+    """アップロードしたオブジェクトがローカルのファイルと一致しない"""
+
+
+_session = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """プロセス内で共有するS3クライアントを取得（クライアントはスレッドセーフ）"""
+    global _session, _client
+    with _client_lock:
+        if _client is None:
+            workers = int(os.getenv('S3_UPLOAD_WORKERS', S3_UPLOAD_WORKERS))
+            _session = boto3.session.Session()
+            _client = _session.client(
+                's3',
+                region_name=S3_REGION,
+                # ファイル数×パート数の同時接続に足りるだけプールを確保する
+                config=Config(max_pool_connections=max(10, workers * S3_PART_CONCURRENCY)),
+            )
+        return _client
+
+
+def public_url(key, bucket=S3_BUCKET):
+    """オブジェクトの公開URL"""
+    return f"https://{bucket}.s3.{S3_REGION}.amazonaws.com/{key}"
+
+
+def s3_checksum_sha256(path, part_size=None):
+    """
+    ファイルをアップロードしたときにS3が返すChecksumSHA256をローカルで計算
+
+    マルチパートの場合はパートごとのSHA-256を連結したもののSHA-256に「-パート数」を付けた値になる。
+    """
+    if part_size is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return base64.b64encode(digest.digest()).decode('ascii')
+
+    part_digests = []
+    with open(path, 'rb') as f:
+        for part in iter(lambda: f.read(part_size), b''):
+            part_digests.append(hashlib.sha256(part).digest())
+    combined = hashlib.sha256(b''.join(part_digests)).digest()
+    return f"{base64.b64encode(combined).decode('ascii')}-{len(part_digests)}"
+
+
+def head_object(client, bucket, key, checksum=False):
+    """オブジェクトのメタデータを取得（存在しなければNone、checksumを指定するとS3のチェックサムも取得）"""
+    try:
+        if checksum:
+            return client.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
+        return client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def matches_local(remote, size, checksum):
+    """S3上のオブジェクトがローカルと同じ内容か（PUT時にメタデータに保存したSHA-256で比較）"""
+    return (remote is not None
+            and remote.get('ContentLength') == size
+            and remote.get('Metadata', {}).get(CHECKSUM_METADATA_KEY) == checksum)
+
+
+def put_if_changed(client, key, body, content_type, cache_control=None, content_encoding=None,
+                   bucket=S3_BUCKET):
+    """
+    内容（SHA-256）またはヘッダー（Cache-Control・Content-Encoding）が変わった場合のみオブジェクトをPUTする
+
+    単一のPUTでContent-MD5を付けて送るため、S3のETagは本文のMD5になり
+    クライアントの条件付きGET（If-None-Match）がそのまま使える。
+
+    Returns:
+        bool: PUTした場合はTrue、同じ内容のためスキップした場合はFalse
+    """
+    checksum = hashlib.sha256(body).hexdigest()
+    remote = head_object(client, bucket, key)
+    # 本文が同じでもキャッシュ・圧縮の設定を変えた場合はヘッダーを更新するためPUTし直す
+    if (matches_local(remote, len(body), checksum)
+            and remote.get('CacheControl') == cache_control
+            and remote.get('ContentEncoding') == content_encoding):
+        return False
+
+    extra_args = {}
+    if cache_control:
+        extra_args['CacheControl'] = cache_control
+    if content_encoding:
+        extra_args['ContentEncoding'] = content_encoding
+    client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentType=content_type,
+        ContentMD5=base64.b64encode(hashlib.md5(body).digest()).decode('ascii'),
+        Metadata={CHECKSUM_METADATA_KEY: checksum},
+        **extra_args,
+    )
+    return True
+
+
+class S3Uploader:
+    """
+    ファイルを受け取り次第バックグラウンドでアップロードする
+
+    submit() はすぐに戻るため、音声の生成中に確定したファイルから順に転送できる。
+    最後に wait() で全アップロードの結果を受け取る。
+    """
+
+    def __init__(self, prefix, bucket=S3_BUCKET, max_workers=None, client=None):
+        self.prefix = prefix.strip('/')
+        self.bucket = bucket
+        self.client = client or get_s3_client()
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+            max_concurrency=S3_PART_CONCURRENCY,
+            use_threads=True,
+        )
+        max_workers = max_workers or int(os.getenv('S3_UPLOAD_WORKERS', S3_UPLOAD_WORKERS))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def key_for(self, path):
+        return f"{self.prefix}/{os.path.basename(path)}"
+
+    def stored_checksum(self, key):
+        """S3上のオブジェクトのChecksumSHA256（オブジェクトまたはチェックサムがなければNone）"""
+        remote = head_object(self.client, self.bucket, key, checksum=True)
+        return remote.get('ChecksumSHA256') if remote else None
+
+    def expected_checksum(self, path):
+        """ローカルのファイルをアップロードしたときにS3が返すChecksumSHA256"""
+        # upload_fileと同じ条件でマルチパートになる場合はパート単位のチェックサムになる
+        size = os.path.getsize(path)
+        part_size = self.transfer_config.multipart_chunksize
+        return s3_checksum_sha256(
+            path, part_size if size >= self.transfer_config.multipart_threshold else None
+        )
+
+    def is_uploaded(self, path):
+        """ローカルのファイルと同じ内容のオブジェクトがS3にあるか"""
+        return self.stored_checksum(self.key_for(path)) == self.expected_checksum(path)
+
+    def upload(self, path):
+        """
+        1ファイルをアップロード（同じ内容のオブジェクトがあればスキップ）
+
+        S3にSHA-256を計算させて本文を検証し、S3が保存したチェックサムが
+        ローカルで計算した値と一致することを確認する。
+
+        Returns:
+            dict: key・url・bytes・skipped
+        """
+        key = self.key_for(path)
+        size = os.path.getsize(path)
+        expected = self.expected_checksum(path)
+        result = {'path': path, 'key': key, 'url': public_url(key, self.bucket), 'bytes': size}
+
+        if self.stored_checksum(key) == expected:
+            print(f"  ⏭️  アップロード済みのためスキップ: {key}")
+            return dict(result, skipped=True)
+
+        started = time.monotonic()
+        extension = os.path.splitext(path)[1].lower()
+        self.client.upload_file(
+            path, self.bucket, key,
+            ExtraArgs={
+                'ContentType': CONTENT_TYPES.get(extension, 'application/octet-stream'),
+                'ChecksumAlgorithm': 'SHA256',
+            },
+            Config=self.transfer_config,
+        )
+
+        # S3が本文から計算したチェックサムがローカルのファイルと一致するか確認
+        stored = self.stored_checksum(key)
+        if stored != expected:
+            raise UploadError(f"アップロード後のチェックサムが一致しません: {key} ({stored} != {expected})")
+
+        print(f"  ☁️  アップロード完了: {key} ({size / 1024 / 1024:.1f} MB, "
+              f"{time.monotonic() - started:.1f}秒)")
+        return dict(result, skipped=False)
+
+    def submit(self, path):
+        """アップロードを予約（同じファイルは1回だけ）"""
+        with self._lock:
+            if path not in self._futures:
+                self._futures[path] = self._executor.submit(self.upload, path)
+            return self._futures[path]
+
+    def wait(self):
+        """
+        予約したすべてのアップロードの完了を待つ
+
+        Returns:
+            list: 各ファイルの結果（失敗したものは error を含む）
+        """
+        self._executor.shutdown(wait=True)
+        results = []
+        for path, future in self._futures.items():
+            try:
+                results.append(dict(future.result(), success=True))
+            except Exception as e:
+                results.append({'path': path, 'key': self.key_for(path), 'success': False,
+                                'error': str(e)})
+        return results
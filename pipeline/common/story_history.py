@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+配信済みニュースの履歴（SQLite）
+- step6で公開したニュースを正規化URLとタイトルのMinHashシグネチャで記録
+- step1で検索結果を照合し、配信済みのニュースを整形前に除外する
+- URLとLSHのバンドキーにインデックスを張るため、履歴が数万件に増えても照合は一定時間
+"""
+import array
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from text_fingerprint import (
+    canonicalize_url,
+    estimated_similarity,
+    lsh_band_keys,
+    minhash_signature,
+    normalize_text,
+    shingles,
+)
+
+project_root = Path(__file__).parent.parent.parent
+STORY_HISTORY_DB = os.getenv('STORY_HISTORY_DB', str(project_root / 'state' / 'story_history.sqlite3'))
+STORY_HISTORY_DAYS = 30  # この日数以内に配信したニュースと照合する
+TITLE_SIMILARITY_THRESHOLD = 0.6  # 同じニュースとみなすタイトルの推定Jaccard類似度
+
+# 「タイトル - サイト名」「タイトル | サイト名」のサイト名部分
+SITE_NAME_SUFFIX = re.compile(r'\s+[-|｜–—]\s+[^-|｜–—]+$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    canonical_url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    signature BLOB,
+    episode TEXT NOT NULL,
+    aired_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS stories_episode_title ON stories (episode, title);
+CREATE INDEX IF NOT EXISTS stories_url ON stories (canonical_url, aired_at);
+CREATE TABLE IF NOT EXISTS story_bands (
+    band_key INTEGER NOT NULL,
+    story_id INTEGER NOT NULL REFERENCES stories (id)
+);
+CREATE INDEX IF NOT EXISTS story_bands_key ON story_bands (band_key);
+"""
+
+
+def title_signature(title):
+    """サイト名を除いたタイトルのMinHashシグネチャ（タイトルが空ならNone）"""
+    title = SITE_NAME_SUFFIX.sub('', title or '')
+    return minhash_signature(shingles(normalize_text(title)))
+
+
+class StoryHistory:
+    """配信済みニュースの履歴"""
+
+    def __init__(self, db_path=STORY_HISTORY_DB, lookback_days=STORY_HISTORY_DAYS):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lookback_days = lookback_days
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def _since(self):
+        return (datetime.now() - timedelta(days=self.lookback_days)).isoformat(timespec='seconds')
+
+    def find(self, url, title):
+        """配信済みの同じニュースを探す（見つからなければNone）"""
+        since = self._since()
+
+        canonical_url = canonicalize_url(url)
+        if canonical_url:
+            row = self.conn.execute(
+                "SELECT title, episode FROM stories WHERE canonical_url = ? AND aired_at >= ? LIMIT 1",
+                (canonical_url, since)
+            ).fetchone()
+            if row:
+                return {'title': row[0], 'episode': row[1], 'match': 'url'}
+
+        signature = title_signature(title)
+        if signature is None:
+            return None
+
+        # バンドキーが一致した候補だけシグネチャを比較する
+        band_keys = lsh_band_keys(signature)
+        placeholders = ','.join('?' * len(band_keys))
+        rows = self.conn.execute(
+            f"SELECT DISTINCT s.title, s.episode, s.signature FROM story_bands b "
+            f"JOIN stories s ON s.id = b.story_id "
+            f"WHERE b.band_key IN ({placeholders}) AND s.aired_at >= ?",
+            (*band_keys, since)
+        ).fetchall()
+        for candidate_title, episode, blob in rows:
+            if estimated_similarity(signature, array.array('Q', blob)) >= TITLE_SIMILARITY_THRESHOLD:
+                return {'title': candidate_title, 'episode': episode, 'match': 'title'}
+        return None
+
+    def record(self, url, title, episode, aired_at=None):
+        """公開したニュースを記録（同じエピソード・タイトルは1回だけ）し、追加したかを返す"""
+        signature = title_signature(title)
+        aired_at = aired_at or datetime.now().isoformat(timespec='seconds')
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO stories (canonical_url, title, signature, episode, aired_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (canonicalize_url(url), title,
+                 array.array('Q', signature).tobytes() if signature else None, episode, aired_at)
+            )
+            if cursor.rowcount == 0:
+                return False
+            if signature:
+                self.conn.executemany(
+                    "INSERT INTO story_bands (band_key, story_id) VALUES (?, ?)",
+                    [(key, cursor.lastrowid) for key in lsh_band_keys(signature)]
+                )
+        return True
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ニュースの同一性判定に使うURL・テキストのフィンガープリント（step1・step6で共通）
+- URLの正規化（www・AMP・トラッキングパラメータ・フラグメントを統一）
+- 文字シングルのMinHashシグネチャと、LSHで類似候補を探すためのバンドキー
+"""
+import hashlib
+import re
+import unicodedata
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+SHINGLE_SIZE = 3  # 文字シングルの長さ
+MINHASH_PERMUTATIONS = 64  # MinHashのハッシュ関数の数
+LSH_BANDS = 16  # LSHのバンド数（1バンドあたり4行）
+
+# URLから除去するトラッキング用パラメータ
+TRACKING_PARAMS = {'fbclid', 'gclid', 'yclid', 'mc_cid', 'mc_eid', 'ref', 'ref_src', 'spm'}
+
+
+def canonicalize_url(url):
+    """URLを正規化（スキーム・www・トラッキングパラメータ・フラグメント・末尾スラッシュ・AMPを統一）"""
+    if not url:
+        return ''
+
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.startswith('amp.'):
+        host = host[4:]
+
+    path = re.sub(r'/amp/?$', '', parts.path) or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ]
+    query.sort()
+
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def normalize_text(text):
+    """比較用にテキストを正規化（全角半角の統一・小文字化・記号と空白の除去）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return re.sub(r'[\s\W_]+', '', text)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """文字シングルの集合"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(shingle_set, permutations=MINHASH_PERMUTATIONS):
+    """MinHashシグネチャ（シード付きハッシュの最小値の列）"""
+    if not shingle_set:
+        return None
+    signature = []
+    for seed in range(permutations):
+        salt = seed.to_bytes(2, 'big')
+        signature.append(min(
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8, salt=salt).digest(), 'big')
+            for s in shingle_set
+        ))
+    return signature
+
+
+def estimated_similarity(signature_a, signature_b):
+    """2つのシグネチャから推定したJaccard類似度"""
+    matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return matches / len(signature_a)
+
+
+def lsh_band_keys(signature, bands=LSH_BANDS):
+    """
+    シグネチャをバンドに分け、バンドごとのキー（符号付き64bit整数）を返す
+
+    どれか1つのバンドのキーが一致した組だけを類似候補として比較すればよい。
+    """
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        payload = band.to_bytes(2, 'big') + b''.join(
+            value.to_bytes(8, 'big') for value in signature[band * rows:(band + 1) * rows]
+        )
+        keys.append(int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), 'big', signed=True))
+    return keys
@@ -11,6 +11,7 @@ import json
 import sys
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -23,6 +24,48 @@ import google.generativeai as genai
 project_root = Path(__file__).parent.parent.parent
 load_dotenv(project_root / '.env')
 
+sys.path.insert(0, str(project_root / 'pipeline' / 'common'))
+from gemini_client import GEMINI_USAGE_FILE, get_gemini_client
+from json_cache import JsonFileCache
+from rate_limiter import TokenBucket, backoff_delay
+from story_history import StoryHistory
+from result_ranker import select_distinct_stories
+
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+SEARCH_MAX_WORKERS = 5  # 同時に実行する検索数
+SEARCH_RATE_PER_MINUTE = 60  # Custom Search APIへのリクエスト速度の上限（クォータに合わせて調整）
+SEARCH_BURST = 5  # 一度に連続して送れるリクエスト数
+SEARCH_MAX_RETRIES = 3  # 429/5xx/通信エラー時のリトライ回数
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+SEARCH_CACHE_DIR = os.getenv('SEARCH_CACHE_DIR', str(project_root / 'cache' / 'search'))
+SEARCH_CACHE_TTL_MINUTES = 180  # 検索結果キャッシュの有効期限（0で無効）
+SEARCH_CACHE_MAX_ENTRIES = 1000  # 検索結果キャッシュの最大件数
+FORMATTING_RESULT_LIMIT = 20  # 整形プロンプトに渡す検索結果（異なるニュース）の最大件数
+# 整形プロンプトに渡す検索結果を整形に使う項目だけに絞り、空白なしのJSONにする（0で従来の形式）
+COMPACT_EVIDENCE = os.getenv('GEMINI_COMPACT_EVIDENCE', '1') != '0'
+EVIDENCE_FIELDS = ['title', 'link', 'snippet']
+FORMATTING_MAX_OUTPUT_TOKENS = 16000  # 整形結果の出力トークン上限（上限で切れた場合は完成したニュースだけを使う）
+
+class SearchError(Exception):
+    """Custom Search APIの検索に失敗した"""
+
+# 整形結果のスキーマ（GeminiのJSONモードで出力形式を固定する）
+NEWS_ITEM_FIELDS = ['title', 'summary', 'source', 'published_date']
+NEWS_RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'news': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {field: {'type': 'STRING'} for field in NEWS_ITEM_FIELDS},
+                'required': NEWS_ITEM_FIELDS,
+            },
+        },
+    },
+    'required': ['news'],
+}
+
 def load_user_preferences(preferences_path="user_preferences.json"):
     """ユーザー属性設定を読み込む"""
     prefs_file = project_root / preferences_path
@@ -40,9 +83,107 @@ def load_user_preferences(preferences_path="user_preferences.json"):
     with open(prefs_file, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def google_custom_search(query, api_key, cx, num=10):
-    """Google Custom Search APIで検索"""
-    url = "https://www.googleapis.com/customsearch/v1"
+def validate_news_item(item):
+    """整形結果の1件を検証し、問題があれば理由を返す（問題なければNone）"""
+    if not isinstance(item, dict):
+        return "オブジェクトではありません"
+    for field in NEWS_ITEM_FIELDS:
+        if not isinstance(item.get(field), str) or not item[field].strip():
+            return f"{field}がありません"
+    if not item['source'].startswith(('http://', 'https://')):
+        return f"ソースがURLではありません ({item['source']})"
+    try:
+        datetime.strptime(item['published_date'], '%Y-%m-%d')
+    except ValueError:
+        return f"日付形式が不正です ({item['published_date']})"
+    return None
+
+def validate_news_items(items):
+    """整形結果を1件ずつ検証し、不正なものだけを除外する"""
+    valid = []
+    for item in items:
+        error = validate_news_item(item)
+        if error is not None:
+            title = item.get('title', 'No Title') if isinstance(item, dict) else 'No Title'
+            print(f"⚠️  {error}（スキップ）: {title}")
+            continue
+        valid.append({field: item[field].strip() for field in NEWS_ITEM_FIELDS})
+    return valid
+
+def salvage_news_items(text):
+    """
+    途中で切れた整形結果のJSONから、最後まで出力されたニュースだけを取り出す
+
+    "news" 配列の要素を先頭から1件ずつraw_decodeし、途中で切れた要素以降は捨てる。
+    """
+    start = text.find('[', max(text.find('"news"'), 0))
+    if start < 0:
+        return []
+
+    decoder = json.JSONDecoder()
+    items = []
+    position = start + 1
+    while True:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    return items
+
+def parse_news_response(text):
+    """整形結果のJSONからニュースのリストを取り出す（JSONが壊れていれば完成した分だけ）"""
+    try:
+        result = json.loads(text)
+    except json.JSONDecodeError as e:
+        # 出力トークン上限で途中まで生成された場合など
+        items = salvage_news_items(text)
+        print(f"⚠️  JSONパースエラー: {e}（完全に出力された {len(items)} 件を使用）")
+        return items
+    return result.get("news", []) if isinstance(result, dict) else []
+
+def finish_reason(response):
+    """レスポンスの終了理由（STOP・MAX_TOKENSなど、取得できなければNone）"""
+    candidates = getattr(response, 'candidates', None) or []
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], 'finish_reason', None)
+    return getattr(reason, 'name', reason)
+
+def serialize_evidence(results, compact=COMPACT_EVIDENCE):
+    """整形プロンプトに埋め込む検索結果のJSON"""
+    if not compact:
+        return json.dumps(results, ensure_ascii=False, indent=2)
+    evidence = [{field: r.get(field, '') for field in EVIDENCE_FIELDS} for r in results]
+    return json.dumps(evidence, ensure_ascii=False, separators=(',', ':'))
+
+def create_search_limiter():
+    """環境変数の設定に従って検索用のレートリミッターを作成"""
+    rate_per_minute = float(os.getenv('SEARCH_RATE_PER_MINUTE', SEARCH_RATE_PER_MINUTE))
+    burst = int(os.getenv('SEARCH_BURST', SEARCH_BURST))
+    return TokenBucket(rate_per_minute / 60, capacity=burst)
+
+def create_search_cache():
+    """環境変数の設定に従って検索結果キャッシュを作成（無効の場合はNone）"""
+    ttl_minutes = float(os.getenv('SEARCH_CACHE_TTL_MINUTES', SEARCH_CACHE_TTL_MINUTES))
+    if ttl_minutes <= 0:
+        return None
+    max_entries = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', SEARCH_CACHE_MAX_ENTRIES))
+    return JsonFileCache(SEARCH_CACHE_DIR, ttl_seconds=ttl_minutes * 60, max_entries=max_entries)
+
+def google_custom_search(query, api_key, cx, num=10, session=None, limiter=None,
+                         max_retries=SEARCH_MAX_RETRIES, cache=None):
+    """
+    Google Custom Search APIで検索
+
+    cacheを指定した場合は (クエリ, cx, dateRestrict, num) が同じ有効期限内の結果を再利用する。
+    429/5xxと通信エラーは指数バックオフでリトライし、それでも失敗した場合は
+    SearchErrorを送出する（空の結果として握りつぶさない）。
+    """
     params = {
         "key": api_key,
         "cx": cx,
@@ -50,14 +191,97 @@ def google_custom_search(query, api_key, cx, num=10):
         "num": num,
         "dateRestrict": "d1",  # 過去1日以内
     }
+    http = session or requests
 
-    try:
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"⚠️  検索エラー: {e}")
-        return {"items": []}
+    cache_key = [query, cx, params['dateRestrict'], num]
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+
+        try:
+            response = http.get(SEARCH_URL, params=params, timeout=30)
+        except requests.RequestException as e:
+            error = f"通信エラー: {e}"
+            retry_after = None
+        else:
+            if response.status_code == 200:
+                result = response.json()
+                if cache is not None:
+                    cache.put(cache_key, result)
+                return result
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                raise SearchError(f"HTTP {response.status_code}: {response.text[:200]}")
+            error = f"HTTP {response.status_code}"
+            retry_after = response.headers.get('Retry-After')
+
+        if attempt == max_retries:
+            break
+
+        # Retry-Afterがあればそれに従い、なければジッター付き指数バックオフ
+        delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff_delay(attempt)
+        print(f"⏳ 検索リトライ ({error}、{delay:.1f}秒後、試行 {attempt + 1}/{max_retries}): {query}")
+        time.sleep(delay)
+
+    raise SearchError(f"{error}（{max_retries}回リトライしても失敗）")
+
+def search_all_queries(queries, api_key, cx, num=10):
+    """
+    全クエリを並列に検索し、届いた順に表示する
+
+    共有セッションとレートリミッターを使い、同時実行数はSEARCH_MAX_WORKERSで制限する。
+    有効期限内のキャッシュがあるクエリはAPIを呼ばない。
+
+    Returns:
+        tuple: (クエリ順に並べた検索結果のリスト, 失敗したクエリと理由のリスト)
+    """
+    max_workers = int(os.getenv('SEARCH_MAX_WORKERS', SEARCH_MAX_WORKERS))
+    limiter = create_search_limiter()
+    cache = create_search_cache()
+    results_by_query = {}
+    failures = []
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(google_custom_search, query, api_key, cx, num, session, limiter,
+                            SEARCH_MAX_RETRIES, cache): (i, query)
+            for i, query in enumerate(queries)
+        }
+
+        for future in as_completed(futures):
+            i, query = futures[future]
+            try:
+                items = future.result().get('items', [])
+            except Exception as e:
+                print(f"⚠️  検索失敗: {query} - {e}")
+                failures.append((query, str(e)))
+                continue
+
+            print(f"🔍 {len(items)} 件取得: {query}")
+            results_by_query[i] = [
+                {
+                    "title": item.get("title", ""),
+                    "snippet": item.get("snippet", ""),
+                    "link": item.get("link", ""),
+                    "source_query": query
+                }
+                for item in items
+            ]
+
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"📊 検索キャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}")
+
+    # クエリの順番を保って結合
+    all_results = []
+    for i in sorted(results_by_query):
+        all_results.extend(results_by_query[i])
+
+    return all_results, failures
 
 def generate_news_topics(api_key=None):
     """ニュース概要を生成"""
@@ -82,8 +306,7 @@ def generate_news_topics(api_key=None):
     print(f"  ニュース数: {prefs['news_count']}")
     print()
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name='gemini-2.5-flash')
+    gemini = get_gemini_client(api_key)
 
     # 検索クエリを生成
     interests_str = "、".join(prefs['interests'])
@@ -98,7 +321,7 @@ def generate_news_topics(api_key=None):
 クエリのみを出力し、説明は不要です。"""
 
     print("🔍 検索クエリを生成中...")
-    response = model.generate_content(query_prompt)
+    response = gemini.generate(query_prompt, 'gemini-2.5-flash', stage='query_generation')
     search_queries = [q.strip() for q in response.text.strip().split('\n') if q.strip()]
 
     print(f"✓ 生成されたクエリ:")
@@ -106,163 +329,115 @@ def generate_news_topics(api_key=None):
         print(f"  {i}. {q}")
     print()
 
-    # 各クエリで検索実行
-    all_results = []
-    for query in search_queries:
-        print(f"🔍 検索中: {query}")
-        results = google_custom_search(query, search_api_key, search_cx, num=10)
+    # 全クエリを並列に検索
+    print(f"🔍 {len(search_queries)} 件のクエリを並列検索中...")
+    all_results, failures = search_all_queries(search_queries, search_api_key, search_cx, num=10)
 
-        if 'items' in results:
-            for item in results['items']:
-                all_results.append({
-                    "title": item.get("title", ""),
-                    "snippet": item.get("snippet", ""),
-                    "link": item.get("link", ""),
-                    "source_query": query
-                })
-        time.sleep(1)  # レート制限対策
+    print(f"✓ 合計 {len(all_results)} 件の検索結果を取得")
+    if failures:
+        print(f"⚠️  {len(failures)}/{len(search_queries)} 件のクエリで検索に失敗しました")
+    print()
+
+    if failures and len(failures) == len(search_queries):
+        raise SearchError(f"すべての検索に失敗しました: {failures[0][1]}")
 
-    print(f"✓ 合計 {len(all_results)} 件の検索結果を取得\n")
+    # 過去に配信したニュース（URLまたはタイトルが一致）を除外
+    with StoryHistory() as history:
+        fresh_results = [r for r in all_results if history.find(r['link'], r['title']) is None]
+        print(f"✓ 配信済みのニュースを除外: {len(all_results) - len(fresh_results)} 件"
+              f"（履歴 {history.count()} 件）\n")
+    all_results = fresh_results
 
     if not all_results:
         print("⚠️  検索結果が見つかりませんでした。")
         return []
 
+    # 重複を除いて興味分野・クエリのカバー率・新しさで順位付けし、上位のみをGeminiに渡す
+    selected_results, cluster_count = select_distinct_stories(
+        all_results, prefs['interests'], FORMATTING_RESULT_LIMIT
+    )
+    print(f"✓ 重複除去: {len(all_results)} 件 → {cluster_count} 件の異なるニュース"
+          f"（上位 {len(selected_results)} 件を使用）\n")
+
     # Geminiに詳細要約を生成させる
     jst = zoneinfo.ZoneInfo("Asia/Tokyo")
     now = datetime.now(jst)
     cutoff_time = now - timedelta(hours=24)
 
-    formatting_prompt = f"""以下の検索結果から、過去24時間以内（{cutoff_time.strftime('%Y-%m-%d %H:%M')} JST以降）に公開された技術ニュースを{prefs['news_count']}個選定し、JSON形式で出力してください。
+    formatting_prompt = f"""以下の検索結果から、過去24時間以内（{cutoff_time.strftime('%Y-%m-%d %H:%M')} JST以降）に公開された技術ニュースを{prefs['news_count']}個選定してください。
 
 検索結果:
-{json.dumps(all_results[:20], ensure_ascii=False, indent=2)}
+{serialize_evidence(selected_results)}
 
 要件:
 - 実在する確認可能なニュースのみ
 - 架空のニュース、製品名は含めない
-- タイトル: 30-50字
+- タイトル（title）: 30-50字
 - 要約（summary）: 検索結果のsnippetを基に、事実のみを記載した要約を200-300字で作成
   * snippetの情報のみを使用すること
   * 推測や補足は一切含めないこと
   * 具体的な技術名、数値、事実を重視すること
-- 日付: YYYY-MM-DD形式（検索結果から推定）
-- ソース: 完全なURL
-
-出力形式:
-{{
-  "news": [
-    {{
-      "title": "...",
-      "summary": "検索結果のsnippetに基づく500-800字の詳細要約",
-      "source": "https://...",
-      "published_date": "YYYY-MM-DD"
-    }}
-  ]
-}}
-
-JSON以外の文字は一切含めないでください。"""
+- 日付（published_date）: YYYY-MM-DD形式（検索結果から推定）
+- ソース（source）: 完全なURL"""
 
     print("📝 検索結果をGeminiで整形中...")
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                formatting_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    max_output_tokens=16000,
-                )
-            )
-
-            response_text = response.text.strip()
-
-            # JSON部分を抽出
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-
-            # JSONをパース
-            result = json.loads(response_text)
-
-            if "news" not in result:
-                raise ValueError("レスポンスに'news'キーが含まれていません")
-
-            news_list = result["news"]
-            print(f"✓ {len(news_list)} 件のニュースを取得しました")
-
-            # 24時間フィルタリング
-            cutoff_date = (now - timedelta(hours=24)).date()
-            filtered_news = []
-
-            for news in news_list:
-                if 'published_date' not in news:
-                    print(f"⚠️  日付情報なし（スキップ）: {news.get('title', 'No Title')}")
-                    continue
-
-                try:
-                    pub_date = datetime.strptime(news['published_date'], '%Y-%m-%d').date()
-                    if pub_date >= cutoff_date:
-                        filtered_news.append(news)
-                    else:
-                        print(f"⚠️  24時間以内でない（スキップ）: {news['title']} ({news['published_date']})")
-                except ValueError:
-                    print(f"⚠️  日付形式が不正（スキップ）: {news['title']} ({news['published_date']})")
-                    continue
-
-            print(f"✓ 24時間フィルタ後: {len(filtered_news)} 件\n")
-
-            # ソート
-            filtered_news.sort(key=lambda x: x['published_date'], reverse=True)
-
-            # 最新N件を選択
-            if len(filtered_news) > prefs['news_count']:
-                filtered_news = filtered_news[:prefs['news_count']]
-                print(f"✓ 最新{prefs['news_count']}件を選択しました\n")
-
-            # 取得したニュースを表示
-            for i, news in enumerate(filtered_news, 1):
-                print(f"[{i}] {news['title']}")
-                print(f"    {news['summary']}")
-                if 'source' in news and news['source']:
-                    print(f"    出典: {news['source']}")
-                if 'published_date' in news:
-                    print(f"    公開日: {news['published_date']}")
-                print()
-
-            return filtered_news
-
-        except json.JSONDecodeError as e:
-            print(f"⚠️  JSONパースエラー (試行 {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                print(f"   5秒後にリトライします...")
-                time.sleep(5)
-                continue
-            else:
-                print(f"✗ リトライ失敗。レスポンス内容:")
-                print(response_text[:500])
-                raise
-
-        except Exception as e:
-            error_message = str(e)
-            if "429" in error_message or "Resource exhausted" in error_message:
-                if attempt < max_retries - 1:
-                    print(f"⏳ レート制限に達しました。60秒待機してリトライします... (試行 {attempt + 1}/{max_retries})")
-                    time.sleep(60)
-                    continue
-                else:
-                    print(f"✗ Gemini API エラー (リトライ失敗): {e}")
-                    raise
-            else:
-                print(f"✗ Gemini API エラー: {e}")
-                raise
-
-    raise RuntimeError("ニュース取得に失敗しました")
-
-def save_news_topics(news_list, output_dir="data"):
-    """ニュース概要をJSONファイルに保存"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # スキーマを指定してJSONモードで出力させる（コードブロックの除去や全体の再生成は不要）
+    response = gemini.generate(
+        formatting_prompt,
+        'gemini-2.5-flash',
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.7,
+            max_output_tokens=FORMATTING_MAX_OUTPUT_TOKENS,
+            response_mime_type='application/json',
+            response_schema=NEWS_RESPONSE_SCHEMA,
+        ),
+        stage='formatting'
+    )
+    # 上限で切れた場合もプロンプト全体を送り直さず、完成したニュースだけを使う
+    if finish_reason(response) == 'MAX_TOKENS':
+        print(f"⚠️  出力トークン上限（{FORMATTING_MAX_OUTPUT_TOKENS}）で途中まで生成されました")
+
+    news_list = validate_news_items(parse_news_response(response.text))
+    print(f"✓ {len(news_list)} 件のニュースを取得しました")
+
+    # 24時間フィルタリング（日付形式は検証済み）
+    cutoff_date = (now - timedelta(hours=24)).date()
+    filtered_news = []
+
+    for news in news_list:
+        pub_date = datetime.strptime(news['published_date'], '%Y-%m-%d').date()
+        if pub_date >= cutoff_date:
+            filtered_news.append(news)
+        else:
+            print(f"⚠️  24時間以内でない（スキップ）: {news['title']} ({news['published_date']})")
+
+    print(f"✓ 24時間フィルタ後: {len(filtered_news)} 件\n")
+
+    # ソート
+    filtered_news.sort(key=lambda x: x['published_date'], reverse=True)
+
+    # 最新N件を選択
+    if len(filtered_news) > prefs['news_count']:
+        filtered_news = filtered_news[:prefs['news_count']]
+        print(f"✓ 最新{prefs['news_count']}件を選択しました\n")
+
+    # 取得したニュースを表示
+    for i, news in enumerate(filtered_news, 1):
+        print(f"[{i}] {news['title']}")
+        print(f"    {news['summary']}")
+        if 'source' in news and news['source']:
+            print(f"    出典: {news['source']}")
+        if 'published_date' in news:
+            print(f"    公開日: {news['published_date']}")
+        print()
+
+    gemini.print_usage_summary()
+
+    return filtered_news
+
+def save_news_topics(news_list, output_dir="data", timestamp=None):
+    """ニュース概要をJSONファイルに保存（timestampを指定しない場合は現在時刻のディレクトリ）"""
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
     timestamp_dir = Path(output_dir) / timestamp
     timestamp_dir.mkdir(parents=True, exist_ok=True)
 
@@ -286,6 +461,7 @@ if __name__ == "__main__":
 
         # 保存
         output_file = save_news_topics(news_list)
+        get_gemini_client().save_usage(Path(output_file).parent / GEMINI_USAGE_FILE)
 
         print()
         print("=" * 60)
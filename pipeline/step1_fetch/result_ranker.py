@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+検索結果の重複除去とランキング
+- URLを正規化して同一記事をまとめる
+- タイトル・snippetの文字シングル（MinHash + LSH）で転載・類似記事をクラスタリング
+- 興味分野との一致・ヒットしたクエリ数・新しさでクラスタを順位付けし、
+  上位の異なるニュースだけをGeminiに渡す
+"""
+import re
+
+from text_fingerprint import (
+    canonicalize_url,
+    estimated_similarity,
+    lsh_band_keys,
+    minhash_signature,
+    normalize_text,
+    shingles,
+)
+
+SIMILARITY_THRESHOLD = 0.5  # 同じニュースとみなす推定Jaccard類似度
+
+# ランキングの重み
+INTEREST_WEIGHT = 1.0
+COVERAGE_WEIGHT = 0.5
+FRESHNESS_WEIGHT = 1.0
+
+# snippet先頭の「3時間前」「5 hours ago」などの相対時刻
+RELATIVE_TIME_PATTERNS = [
+    (re.compile(r'(\d+)\s*分前'), 1 / 60),
+    (re.compile(r'(\d+)\s*時間前'), 1),
+    (re.compile(r'(\d+)\s*日前'), 24),
+    (re.compile(r'(\d+)\s*mins?\b.*?ago', re.IGNORECASE), 1 / 60),
+    (re.compile(r'(\d+)\s*hours?\s+ago', re.IGNORECASE), 1),
+    (re.compile(r'(\d+)\s*days?\s+ago', re.IGNORECASE), 24),
+]
+
+
+def parse_hours_ago(snippet):
+    """snippet中の相対時刻から経過時間（時間）を推定（不明ならNone）"""
+    for pattern, hours_per_unit in RELATIVE_TIME_PATTERNS:
+        match = pattern.search(snippet or '')
+        if match:
+            return int(match.group(1)) * hours_per_unit
+    return None
+
+
+def cluster_results(results, threshold=SIMILARITY_THRESHOLD):
+    """
+    検索結果を同じニュースごとのクラスタにまとめる
+
+    Returns:
+        list: クラスタ（検索結果のリスト）のリスト
+    """
+    parent = list(range(len(results)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    # 正規化したURLが同じものは同一記事
+    by_url = {}
+    for i, result in enumerate(results):
+        url = canonicalize_url(result.get('link', ''))
+        if url in by_url:
+            union(by_url[url], i)
+        elif url:
+            by_url[url] = i
+
+    # タイトル+snippetが似ているものは転載・同一ニュース
+    signatures = [
+        minhash_signature(shingles(normalize_text(r.get('title', '') + r.get('snippet', ''))))
+        for r in results
+    ]
+    buckets = {}
+    candidate_pairs = set()
+    for i, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for bucket in lsh_band_keys(signature):
+            for j in buckets.get(bucket, []):
+                candidate_pairs.add((j, i))
+            buckets.setdefault(bucket, []).append(i)
+
+    for i, j in candidate_pairs:
+        if estimated_similarity(signatures[i], signatures[j]) >= threshold:
+            union(i, j)
+
+    clusters = {}
+    for i, result in enumerate(results):
+        clusters.setdefault(find(i), []).append(result)
+    return list(clusters.values())
+
+
+def interest_terms(interest):
+    """「人工知能（AI）」のような興味分野を比較用の語（人工知能 / ai）に分ける"""
+    terms = [normalize_text(term) for term in re.split(r'[（）()、,/・\s]+', interest)]
+    return [term for term in terms if len(term) >= 2]
+
+
+def score_cluster(cluster, interests, query_count):
+    """興味分野との一致・クエリのカバー率・新しさからクラスタのスコアを計算"""
+    text = normalize_text(' '.join(r.get('title', '') + r.get('snippet', '') for r in cluster))
+
+    term_lists = [terms for terms in (interest_terms(i) for i in interests) if terms]
+    matched = sum(1 for terms in term_lists if any(term in text for term in terms))
+    interest_score = matched / len(term_lists) if term_lists else 0.0
+
+    queries = {r.get('source_query') for r in cluster}
+    coverage_score = len(queries) / query_count if query_count else 0.0
+
+    hours = [h for h in (parse_hours_ago(r.get('snippet', '')) for r in cluster) if h is not None]
+    freshness_score = max(0.0, 1 - min(hours) / 24) if hours else 0.5  # 不明な場合は中間値
+
+    return (INTEREST_WEIGHT * interest_score
+            + COVERAGE_WEIGHT * coverage_score
+            + FRESHNESS_WEIGHT * freshness_score)
+
+
+def select_distinct_stories(results, interests, limit):
+    """
+    検索結果から重複を除き、スコアの高い異なるニュースを最大limit件選ぶ
+
+    各クラスタからはsnippetが最も長い結果を代表として残し、
+    同じニュースを拾ったクエリはsource_queryにまとめる。
+
+    Returns:
+        tuple: (選ばれた検索結果のリスト, クラスタ数)
+    """
+    if not results:
+        return [], 0
+
+    query_count = len({r.get('source_query') for r in results})
+    clusters = cluster_results(results)
+
+    scored = []
+    for cluster in clusters:
+        representative = dict(max(cluster, key=lambda r: len(r.get('snippet', ''))))
+        queries = []
+        for r in cluster:
+            if r.get('source_query') not in queries:
+                queries.append(r.get('source_query'))
+        representative['source_query'] = ' / '.join(q for q in queries if q)
+        scored.append((score_cluster(cluster, interests, query_count), representative))
+
+    # スコアが同じ場合は元の順番（クエリ順）を保つ
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    return [representative for _, representative in scored[:limit]], len(clusters)
@@ -16,6 +16,19 @@ import google.generativeai as genai
 project_root = Path(__file__).parent.parent.parent
 load_dotenv(project_root / '.env')
 
+sys.path.insert(0, str(project_root / 'pipeline' / 'common'))
+from gemini_client import GEMINI_USAGE_FILE, get_gemini_client
+from json_cache import JsonFileCache
+
+NARRATION_MODEL = 'gemini-2.0-flash'
+NARRATION_GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 3000,
+}
+NARRATION_CACHE_DIR = os.getenv('NARRATION_CACHE_DIR', str(project_root / 'cache' / 'narration'))
+NARRATION_CACHE_MAX_ENTRIES = 500  # ナレーションキャッシュの最大件数（0で無効）
+STREAM_CLEAN_PREFIX_LENGTH = 200  # ストリーミング時に前置き文言の除去のために溜める冒頭の文字数
+
 # システムプロンプト
 SYSTEM_PROMPT = """あなたは技術系ニュースを音声コンテンツ向けに解説する音声原稿ライターです。
 与えられたニュース概要を元に、7-10分程度のナレーション原稿を自然な日本語で生成してください。
@@ -34,25 +47,9 @@ SYSTEM_PROMPT = """あなたは技術系ニュースを音声コンテンツ向
 - 補足説明が必要な場合は一般的に広く知られている範囲に限る
 - 全体で5-7分の読み上げ（1500〜2000字）を想定する
 
-音声読み上げ用の表記ルール（重要）:
-- アルファベット略語は必ずカタカナで表記する
-  例: S3 → エススリー、EC2 → イーシーツー、AI → エーアイ、API → エーピーアイ
-- 数字を含む略語も同様にカタカナで表記する
-  例: AWS → エーダブリューエス、GCP → ジーシーピー、HTML5 → エイチティーエムエルファイブ
-- バージョン番号は「ばーじょん」を付けて表記する
-  例: Python 3.13 → パイソン ばーじょん さんてんいちさん
-- URLやファイルパスは読み上げに適した形に変換する
-  例: github.com → ぎっとはぶ どっと こむ
-- 固有名詞の正しい読み方（括弧による読み仮名付記は絶対に禁止）:
-  Laravel → ララベル（「ラーベル」は誤り）
-  Python → パイソン
-  React → リアクト
-  Vue → ビュー
-  Docker → ドッカー
-  Kubernetes → クーバネティス または クバネテス
-- 固有名詞は必ず正しいカタカナ表記のみを使用し、括弧付きの読み仮名を付けてはいけない
-  正しい例: ララベルイレブンの最新アップデート
-  誤った例: Laravel（ララベル）イレブン ← 括弧で読み仮名を付けるのは禁止
+表記:
+- 英字の製品名・略語・バージョン番号・URLは原文どおりの英字で表記する（読み方への変換は音声生成時に辞書で行う）
+- 括弧による読み仮名の付記はしない
 
 絶対に禁止:
 - 「承知しました」「かしこまりました」「以下の通りです」などのAIアシスタント特有の応答
@@ -92,7 +89,72 @@ def clean_narration(text):
     text = text.lstrip()
     return text
 
-def generate_narration_for_topic(topic, index, total, api_key):
+USER_PROMPT_TEMPLATE = """ニュース概要:
+タイトル: {title}
+概要: {summary}
+
+上記のニュース概要を基に、詳細な技術解説を含む5-7分のナレーション原稿を作成してください。
+
+重要: 1文字目からタイトルを開始してください。前置きコメントは絶対に出力しないでください。"""
+
+def create_narration_cache():
+    """環境変数の設定に従ってナレーションキャッシュを作成（無効の場合はNone）"""
+    max_entries = int(os.getenv('NARRATION_CACHE_MAX_ENTRIES', NARRATION_CACHE_MAX_ENTRIES))
+    if max_entries <= 0:
+        return None
+    return JsonFileCache(NARRATION_CACHE_DIR, max_entries=max_entries)
+
+def narration_cache_key(topic):
+    """
+    ナレーションキャッシュのキー
+
+    プロンプト・モデル・生成設定を含めるため、これらを変更すると自動的に再生成される。
+    """
+    return [
+        topic['title'],
+        topic['summary'],
+        SYSTEM_PROMPT,
+        USER_PROMPT_TEMPLATE,
+        NARRATION_MODEL,
+        NARRATION_GENERATION_CONFIG,
+    ]
+
+def stream_narration(response, on_text):
+    """
+    ストリーミングで受け取ったナレーションを、前置き文言を除去しながら順次渡す
+
+    前置き文言は冒頭にしか現れないため、STREAM_CLEAN_PREFIX_LENGTH文字
+    （その時点の最後の改行まで）を溜めてからclean_narrationを適用し、以降はそのまま渡す。
+
+    Returns:
+        str: 渡したテキスト全体（ナレーション原稿）
+    """
+    parts = []
+    leading = ''
+    cleaned = False
+
+    for chunk in response:
+        text = chunk.text
+        if not cleaned:
+            leading += text
+            if len(leading) < STREAM_CLEAN_PREFIX_LENGTH:
+                continue
+            cut = leading.rfind('\n') + 1 or len(leading)
+            text = clean_narration(leading[:cut]) + leading[cut:]
+            cleaned = True
+        if text:
+            parts.append(text)
+            on_text(text)
+
+    # 冒頭の文字数に満たないまま生成が終わった場合
+    if not cleaned and leading:
+        text = clean_narration(leading)
+        parts.append(text)
+        on_text(text)
+
+    return ''.join(parts)
+
+def generate_narration_for_topic(topic, index, total, client, cache=None, on_text=None):
     """
     1つのニュース概要について詳細ナレーションを生成
 
@@ -100,109 +162,98 @@ def generate_narration_for_topic(topic, index, total, api_key):
         topic: ニュース概要 {"title": ..., "summary": ...}
         index: インデックス（1始まり）
         total: 全体の数
-        api_key: Gemini API Key
+        client: 共有のGeminiClient（速度制限・リトライ予算はスレッド間で共有）
+        cache: ナレーションキャッシュ（Noneの場合はキャッシュを使わない）
+        on_text: 指定した場合は出力をストリーミングで受け取り、届いたテキストを
+                 (インデックス, ニュース概要, テキスト) で順次渡す（音声生成へのストリーミング用）
 
     Returns:
         dict: 成功/失敗情報とナレーション原稿
     """
     print(f"[{index}/{total}] {topic['title']}")
 
-    genai.configure(api_key=api_key)
-
-    model = genai.GenerativeModel(
-        model_name='gemini-2.0-flash',
-        system_instruction=SYSTEM_PROMPT
-    )
-
-    user_prompt = f"""ニュース概要:
-タイトル: {topic['title']}
-概要: {topic['summary']}
-
-上記のニュース概要を基に、詳細な技術解説を含む5-7分のナレーション原稿を作成してください。
+    if cache is not None:
+        narration = cache.get(narration_cache_key(topic))
+        if narration is not None:
+            print(f"  ♻️  キャッシュを使用 ({len(narration)} 文字)\n")
+            return {
+                'success': True,
+                'index': index,
+                'topic': topic,
+                'narration': narration
+            }
 
-重要: 1文字目からタイトルを開始してください。前置きコメントは絶対に出力しないでください。"""
+    user_prompt = USER_PROMPT_TEMPLATE.format(title=topic['title'], summary=topic['summary'])
 
     print(f"  📝 ナレーション原稿を生成中...")
 
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                user_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    max_output_tokens=3000,
-                )
-            )
+    try:
+        started = time.monotonic()
+        response = client.generate(
+            user_prompt,
+            NARRATION_MODEL,
+            system_instruction=SYSTEM_PROMPT,
+            generation_config=genai.types.GenerationConfig(**NARRATION_GENERATION_CONFIG),
+            label=f" [{index}/{total}]",
+            stream=on_text is not None,
+            stage='narration'
+        )
+
+        if on_text is None:
+            narration = clean_narration(response.text)
+        else:
+            narration = stream_narration(response, lambda text: on_text(index, topic, text))
+            # ストリーミングのusage_metadataは受信し終えた後に確定する
+            client.record_usage('narration', response, time.monotonic() - started)
 
-            narration = response.text
-            narration = clean_narration(narration)
+        print(f"  ✓ 生成完了 ({len(narration)} 文字)\n")
 
-            print(f"  ✓ 生成完了 ({len(narration)} 文字)\n")
+        if cache is not None:
+            cache.put(narration_cache_key(topic), narration)
 
-            return {
-                'success': True,
-                'index': index,
-                'topic': topic,
-                'narration': narration
-            }
+        return {
+            'success': True,
+            'index': index,
+            'topic': topic,
+            'narration': narration
+        }
 
-        except Exception as e:
-            error_message = str(e)
-
-            if "429" in error_message or "Resource exhausted" in error_message:
-                if attempt < max_retries - 1:
-                    print(f"  ⏳ レート制限。60秒待機... (試行 {attempt + 1}/{max_retries})")
-                    time.sleep(60)
-                    continue
-                else:
-                    print(f"  ✗ API エラー (リトライ失敗): {e}\n")
-                    return {
-                        'success': False,
-                        'index': index,
-                        'topic': topic,
-                        'error': str(e)
-                    }
-            else:
-                print(f"  ✗ API エラー: {e}\n")
-                return {
-                    'success': False,
-                    'index': index,
-                    'topic': topic,
-                    'error': str(e)
-                }
+    except Exception as e:
+        print(f"  ✗ API エラー: {e}\n")
+        return {
+            'success': False,
+            'index': index,
+            'topic': topic,
+            'error': str(e)
+        }
 
+def to_narration_entry(result):
+    """生成結果をsummarized.jsonの1件分の形式に変換"""
     return {
-        'success': False,
-        'index': index,
-        'topic': topic,
-        'error': '最大リトライ回数を超えました'
+        'title': result['topic']['title'],
+        'summary': result['topic']['summary'],
+        'source': result['topic'].get('source', ''),
+        'narration_script': result['narration']
     }
 
-def generate_narrations_from_topics(topics_file, output_file=None, api_key=None):
+def generate_narrations(topics, api_key=None, on_narration=None, on_text=None):
     """
     ニュース概要から詳細ナレーションを並列生成
 
     Args:
-        topics_file: topics.jsonのパス
-        output_file: 出力ファイルパス（Noneの場合は同じディレクトリにsummarized.json）
+        topics: ニュース概要のリスト
         api_key: Gemini API Key
+        on_narration: ナレーションが1件生成されるたびに呼ばれる関数
+                      （引数はインデックスとsummarized.jsonの1件分、音声生成へのストリーミング用）
+        on_text: 指定した場合はGeminiの出力をストリーミングで受け取り、届いたテキストを
+                 順次渡す（引数はインデックス・ニュース概要・テキスト）。
+                 キャッシュから取得したナレーションはon_narrationのみが呼ばれる
 
     Returns:
-        str: 出力ファイルパス
+        list: 生成できたナレーション（summarized.jsonの形式、インデックス順）
     """
-    if api_key is None:
-        api_key = os.getenv("GEMINI_API_KEY")
-
-    if not api_key:
-        raise ValueError("Gemini APIキーが設定されていません。")
-
-    print(f"📖 ニュース概要を読み込み中: {topics_file}")
-
-    with open(topics_file, 'r', encoding='utf-8') as f:
-        topics = json.load(f)
-
-    print(f"✓ {len(topics)} 件のニュース概要を読み込みました\n")
+    client = get_gemini_client(api_key)
+    cache = create_narration_cache()
 
     # 環境変数から並列数を取得（デフォルトは5）
     max_workers = int(os.getenv('GEMINI_MAX_WORKERS', '5'))
@@ -213,7 +264,8 @@ def generate_narrations_from_topics(topics_file, output_file=None, api_key=None)
     # 並列処理でナレーション生成
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(generate_narration_for_topic, topic, i, len(topics), api_key): i
+            executor.submit(generate_narration_for_topic, topic, i, len(topics), client, cache,
+                            on_text): i
             for i, topic in enumerate(topics, 1)
         }
 
@@ -221,6 +273,9 @@ def generate_narrations_from_topics(topics_file, output_file=None, api_key=None)
             result = future.result()
             results.append(result)
 
+            if on_narration is not None and result['success']:
+                on_narration(result['index'], to_narration_entry(result))
+
     # インデックス順にソート
     results.sort(key=lambda x: x['index'])
 
@@ -228,28 +283,64 @@ def generate_narrations_from_topics(topics_file, output_file=None, api_key=None)
     narrations = []
     for result in results:
         if result['success']:
-            narrations.append({
-                'title': result['topic']['title'],
-                'summary': result['topic']['summary'],
-                'source': result['topic'].get('source', ''),
-                'narration_script': result['narration']
-            })
+            narrations.append(to_narration_entry(result))
         else:
             print(f"⚠️  [{result['index']}] {result['topic']['title']} - 生成失敗: {result.get('error', 'Unknown')}")
 
     print(f"\n✓ 完了: {len(narrations)}/{len(topics)} 件のナレーションを生成しました")
 
-    # 出力ファイルパスの決定
-    if output_file is None:
-        input_dir = Path(topics_file).parent
-        output_file = input_dir / "summarized.json"
+    gemini_stats = client.stats()
+    print(f"📊 Gemini: リクエスト {gemini_stats['requests']} 回 / "
+          f"レート制限 {gemini_stats['rate_limited']} 回 / "
+          f"リトライ {gemini_stats['retries']}/{gemini_stats['retry_budget']} 回")
+    client.print_usage_summary()
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"📊 ナレーションキャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}")
 
-    # JSONファイルとして保存
+    return narrations
+
+def save_narrations(narrations, output_file, api_key=None):
+    """ナレーション原稿をJSONファイルに保存（Geminiの使用量も同じディレクトリに保存）"""
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(narrations, f, ensure_ascii=False, indent=2)
 
     print(f"💾 ナレーション原稿を保存しました: {output_file}")
 
+    get_gemini_client(api_key).save_usage(Path(output_file).parent / GEMINI_USAGE_FILE)
+
+def generate_narrations_from_topics(topics_file, output_file=None, api_key=None, on_narration=None,
+                                    on_text=None, topics=None):
+    """
+    topics.jsonのニュース概要から詳細ナレーションを並列生成して保存
+
+    Args:
+        topics_file: topics.jsonのパス
+        output_file: 出力ファイルパス（Noneの場合は同じディレクトリにsummarized.json）
+        api_key: Gemini API Key
+        on_narration, on_text: generate_narrations() と同じ
+        topics: 読み込み済みのニュース概要（指定した場合はtopics_fileを読まない）
+
+    Returns:
+        str: 出力ファイルパス
+    """
+    if topics is None:
+        print(f"📖 ニュース概要を読み込み中: {topics_file}")
+
+        with open(topics_file, 'r', encoding='utf-8') as f:
+            topics = json.load(f)
+
+        print(f"✓ {len(topics)} 件のニュース概要を読み込みました\n")
+
+    narrations = generate_narrations(topics, api_key, on_narration, on_text)
+
+    # 出力ファイルパスの決定
+    if output_file is None:
+        input_dir = Path(topics_file).parent
+        output_file = input_dir / "summarized.json"
+
+    save_narrations(narrations, output_file, api_key)
+
     return str(output_file)
 
 if __name__ == "__main__":
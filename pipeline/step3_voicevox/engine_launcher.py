@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+VOICEVOXエンジン（Dockerコンテナ）の起動確認（run.shと同じ手順のPython版）
+- ポート50021から連番でVOICEVOX_ENGINE_COUNT台のエンジンを確認し、起動していなければコンテナを起動
+- すべてのエンジンが応答するまで待つ
+"""
+import os
+import subprocess
+import time
+
+import requests
+
+VOICEVOX_IMAGE = 'voicevox/voicevox_engine:cpu-latest'
+VOICEVOX_BASE_PORT = 50021
+STARTUP_TIMEOUT_SECONDS = 60  # 1台あたりの起動待ちの上限
+
+
+def container_name(n):
+    return 'voicevox-engine' if n == 0 else f'voicevox-engine-{n + 1}'
+
+
+def engine_version(port):
+    """エンジンのバージョン（応答がなければNone）"""
+    try:
+        response = requests.get(f"http://localhost:{port}/version", timeout=2)
+        response.raise_for_status()
+        return response.text.strip('"')
+    except requests.RequestException:
+        return None
+
+
+def start_container(n, port):
+    """既存のコンテナを削除してからエンジンのコンテナを起動"""
+    name = container_name(n)
+    subprocess.run(['docker', 'rm', '-f', name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    print(f"  VOICEVOXコンテナを起動中... ({name})")
+    subprocess.run(['docker', 'run', '--rm', '-d', '-p', f"{port}:50021", '--name', name, VOICEVOX_IMAGE],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def ensure_engines(engine_count=None, timeout=STARTUP_TIMEOUT_SECONDS):
+    """
+    VOICEVOXエンジンを起動して応答するまで待つ
+
+    Returns:
+        dict: {ポート: バージョン}
+    """
+    engine_count = engine_count or int(os.getenv('VOICEVOX_ENGINE_COUNT', '1'))
+    ports = [VOICEVOX_BASE_PORT + n for n in range(engine_count)]
+
+    for n, port in enumerate(ports):
+        if engine_version(port) is None:
+            print(f"⚠️  VOICEVOX (ポート {port}) が起動していません。自動起動します...")
+            start_container(n, port)
+
+    versions = {}
+    for port in ports:
+        deadline = time.monotonic() + timeout
+        version = engine_version(port)
+        if version is None:
+            print(f"  起動を待機中... (ポート {port})")
+        while version is None:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"VOICEVOX (ポート {port}) の起動がタイムアウトしました")
+            time.sleep(1)
+            version = engine_version(port)
+
+        versions[port] = version
+        print(f"✓ VOICEVOX is running (http://localhost:{port})")
+        print(f"  Version: {version}")
+
+    return versions
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+VOICEVOXのウォームアップと合成速度の計測
+- 各エンジンで話者モデルを事前に読み込む（/initialize_speaker）
+- キャリブレーション用の文章を合成し、1文字あたりの合成速度を計測
+- 計測結果をファイルに記録し、step4のチャンク上限・タイムアウト・並列数制御に使う
+- 読み辞書（reading_dictionary.json）の単語をVOICEVOXのユーザー辞書に登録
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / 'pipeline' / 'step4_audio'))
+
+from generate_audio_from_json import (
+    SPEAKER_ID,
+    VOICEVOX_PREFLIGHT_FILE,
+    get_voicevox_urls,
+)
+from reading_normalizer import load_words
+from voicevox_client import VoicevoxClient, sync_user_dictionary
+
+PREFLIGHT_TIMEOUT = 180  # モデル読み込みを含むため通常より長めに待つ（秒）
+CALIBRATION_TEXT = (
+    "おはようございます。今日の技術ニュースをお届けします。"
+    "最新のクラウドサービスや開発者ツールの動向について、わかりやすく解説していきます。"
+)
+
+
+def preflight_engine(url, speaker_id, words=()):
+    """1台のエンジンをウォームアップして合成速度を計測"""
+    client = VoicevoxClient(url, max_concurrency=1, timeout=PREFLIGHT_TIMEOUT)
+    try:
+        version = client.version()
+
+        # ユーザー辞書を同期してから計測する
+        added, updated = sync_user_dictionary(client, words) if words else (0, 0)
+
+        # 話者モデルの読み込み
+        started = time.monotonic()
+        client.initialize_speaker(speaker_id)
+        initialize_seconds = time.monotonic() - started
+
+        # 1回目はウォームアップ、2回目で速度を計測
+        started = time.monotonic()
+        client.synthesize(CALIBRATION_TEXT, speaker_id)
+        warmup_seconds = time.monotonic() - started
+
+        started = time.monotonic()
+        client.synthesize(CALIBRATION_TEXT, speaker_id)
+        calibration_seconds = time.monotonic() - started
+    finally:
+        client.close()
+
+    return {
+        'version': version,
+        'initialize_seconds': round(initialize_seconds, 2),
+        'warmup_seconds': round(warmup_seconds, 2),
+        'user_dict_added': added,
+        'user_dict_updated': updated,
+        'chars_per_second': round(len(CALIBRATION_TEXT) / calibration_seconds, 2),
+    }
+
+
+def run_preflight(speaker_id=SPEAKER_ID, output_file=VOICEVOX_PREFLIGHT_FILE):
+    """全エンジンのウォームアップを行い、計測結果を保存"""
+    engines = {}
+    words = load_words()
+    for url in get_voicevox_urls():
+        print(f"🔥 ウォームアップ中: {url} (話者ID {speaker_id})")
+        try:
+            result = preflight_engine(url, speaker_id, words)
+        except Exception as e:
+            print(f"  ✗ ウォームアップに失敗しました: {e}")
+            continue
+
+        engines[url] = result
+        print(f"  ✓ モデル読み込み {result['initialize_seconds']} 秒 / "
+              f"初回合成 {result['warmup_seconds']} 秒 / "
+              f"{result['chars_per_second']} 文字/秒")
+        print(f"  ✓ ユーザー辞書: 追加 {result['user_dict_added']} 語 / 更新 {result['user_dict_updated']} 語")
+
+    if not engines:
+        raise RuntimeError("ウォームアップできたVOICEVOXエンジンがありません")
+
+    profile = {
+        'speaker_id': speaker_id,
+        'measured_at': datetime.now().isoformat(timespec='seconds'),
+        'engines': engines,
+    }
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, output_file)
+
+    print(f"💾 計測結果を保存しました: {output_file}")
+    return profile
+
+
+if __name__ == "__main__":
+    try:
+        run_preflight()
+    except Exception as e:
+        print(f"\n✗ エラーが発生しました: {e}")
+        sys.exit(1)
@@ -8,42 +8,91 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/../.." && pwd)"
 
 cd "$PROJECT_ROOT"
 
+# .envファイルを読み込む
+if [ -f ".env" ]; then
+    while IFS='=' read -r key value; do
+        # コメント行と空行をスキップ
+        [[ "$key" =~ ^#.*$ ]] && continue
+        [[ -z "$key" ]] && continue
+        # インラインコメントを削除
+        value="${value%%#*}"
+        # 前後の空白を削除
+        value=$(echo "$value" | sed -e 's/^[[:space:]]*//' -e 's/[[:space:]]*$//')
+        # 環境変数としてエクスポート
+        export "$key=$value"
+    done < .env
+fi
+
+# 起動するVOICEVOXエンジン数（ポート50021から連番）
+ENGINE_COUNT="${VOICEVOX_ENGINE_COUNT:-1}"
+BASE_PORT=50021
+
 echo "=================================="
 echo "Step 3: Checking VOICEVOX..."
 echo "=================================="
 
-# VOICEVOXの起動確認
-if ! curl -s http://localhost:50021/version > /dev/null 2>&1; then
-    echo "⚠️  VOICEVOX が起動していません。自動起動します..."
+for ((n = 0; n < ENGINE_COUNT; n++)); do
+    PORT=$((BASE_PORT + n))
+    if [ $n -eq 0 ]; then
+        CONTAINER_NAME="voicevox-engine"
+    else
+        CONTAINER_NAME="voicevox-engine-$((n + 1))"
+    fi
+
+    # VOICEVOXの起動確認
+    if ! curl -s "http://localhost:${PORT}/version" > /dev/null 2>&1; then
+        echo "⚠️  VOICEVOX (ポート ${PORT}) が起動していません。自動起動します..."
+
+        # 既存のコンテナを削除（存在する場合）
+        if docker ps -a --format '{{.Names}}' | grep -q "^${CONTAINER_NAME}\$"; then
+            echo "  既存のコンテナを削除中..."
+            docker rm -f "$CONTAINER_NAME" > /dev/null 2>&1
+        fi
 
-    # 既存のコンテナを削除（存在する場合）
-    if docker ps -a --format '{{.Names}}' | grep -q '^voicevox-engine$'; then
-        echo "  既存のコンテナを削除中..."
-        docker rm -f voicevox-engine > /dev/null 2>&1
+        # VOICEVOXコンテナを起動
+        echo "  VOICEVOXコンテナを起動中... ($CONTAINER_NAME)"
+        docker run --rm -d -p "${PORT}:50021" --name "$CONTAINER_NAME" voicevox/voicevox_engine:cpu-latest > /dev/null
     fi
+done
 
-    # VOICEVOXコンテナを起動
-    echo "  VOICEVOXコンテナを起動中..."
-    docker run --rm -d -p 50021:50021 --name voicevox-engine voicevox/voicevox_engine:cpu-latest > /dev/null
+# 起動待機（各エンジン最大60秒）
+for ((n = 0; n < ENGINE_COUNT; n++)); do
+    PORT=$((BASE_PORT + n))
 
-    # 起動待機（最大60秒）
-    echo "  起動を待機中..."
     for i in {1..60}; do
-        if curl -s http://localhost:50021/version > /dev/null 2>&1; then
-            echo "  ✓ VOICEVOX が起動しました"
+        if curl -s "http://localhost:${PORT}/version" > /dev/null 2>&1; then
             break
         fi
+        if [ $i -eq 1 ]; then
+            echo "  起動を待機中... (ポート ${PORT})"
+        fi
         sleep 1
         if [ $i -eq 60 ]; then
-            echo "  ✗ VOICEVOX の起動がタイムアウトしました"
+            echo "  ✗ VOICEVOX (ポート ${PORT}) の起動がタイムアウトしました"
             exit 1
         fi
     done
+
+    # バージョン情報取得
+    VERSION=$(curl -s "http://localhost:${PORT}/version")
+    echo "✓ VOICEVOX is running (http://localhost:${PORT})"
+    echo "  Version: $VERSION"
+done
+
+# ウォームアップ（話者モデルの読み込みと合成速度の計測）
+if [ ! -d "venv" ]; then
+    echo "✗ 仮想環境が見つかりません"
+    echo "  ./setup.sh を実行してください"
+    exit 1
 fi
 
-# バージョン情報取得
-VERSION=$(curl -s http://localhost:50021/version)
-echo "✓ VOICEVOX is running"
-echo "  Version: $VERSION"
+source venv/bin/activate
+
+echo ""
+echo "VOICEVOXをウォームアップ中..."
+if ! python3 pipeline/step3_voicevox/preflight.py; then
+    echo "⚠️  ウォームアップに失敗しました（step4は前回の計測値または既定値で実行します）"
+fi
 
+deactivate
 exit 0
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+WAVを圧縮音声（MP3/AAC/Opus）にエンコード
+ローカルのエンコーダー（ffmpeg）にPCMをパイプで流し込む
+"""
+import os
+import subprocess
+import wave
+
+# 出力形式ごとの拡張子・MIMEタイプ・エンコーダー引数
+AUDIO_FORMATS = {
+    'mp3': {
+        'ext': '.mp3',
+        'mime': 'audio/mpeg',
+        'args': ['-c:a', 'libmp3lame', '-f', 'mp3'],
+    },
+    'aac': {
+        'ext': '.m4a',
+        'mime': 'audio/mp4',
+        'args': ['-c:a', 'aac', '-movflags', '+faststart', '-f', 'ipod'],
+    },
+    'opus': {
+        'ext': '.opus',
+        'mime': 'audio/ogg',
+        'args': ['-c:a', 'libopus', '-f', 'opus'],
+    },
+}
+
+PCM_BLOCK_FRAMES = 24000  # エンコーダーに一度に書き込むフレーム数（24kHzで1秒分）
+
+
+def encoded_path_for(wav_path, audio_format):
+    """WAVのパスから圧縮後のファイルパスを作成"""
+    return os.path.splitext(wav_path)[0] + AUDIO_FORMATS[audio_format]['ext']
+
+
+def encode_wav(wav_path, audio_format='mp3', encoder='ffmpeg', bitrate='64k'):
+    """
+    WAVファイルを圧縮音声にエンコード
+
+    WAVを一定フレーム数ずつ読み、生PCMとしてエンコーダーの標準入力に流す。
+    書き込み中は .part に出力し、成功した時点でリネームする。
+
+    Args:
+        wav_path: 入力WAVファイルのパス
+        audio_format: 'mp3' / 'aac' / 'opus'
+        encoder: エンコーダー（ffmpeg互換）の実行ファイル
+        bitrate: ビットレート（例: '64k'）
+
+    Returns:
+        str: エンコード後のファイルパス
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"未対応の音声形式です: {audio_format}")
+
+    output_path = encoded_path_for(wav_path, audio_format)
+    partial_path = output_path + '.part'
+
+    with wave.open(wav_path, 'rb') as input_wav:
+        if input_wav.getsampwidth() != 2:
+            raise ValueError(f"16bit PCM以外のWAVには対応していません: {wav_path}")
+
+        command = [
+            encoder, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 's16le',
+            '-ar', str(input_wav.getframerate()),
+            '-ac', str(input_wav.getnchannels()),
+            '-i', 'pipe:0',
+            '-b:a', bitrate,
+            *AUDIO_FORMATS[audio_format]['args'],
+            partial_path,
+        ]
+
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            while True:
+                frames = input_wav.readframes(PCM_BLOCK_FRAMES)
+                if not frames:
+                    break
+                process.stdin.write(frames)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read()
+        return_code = process.wait()
+
+    if return_code != 0:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise RuntimeError(f"エンコードに失敗しました ({return_code}): {stderr.decode('utf-8', 'replace').strip()}")
+
+    os.replace(partial_path, output_path)
+    return output_path
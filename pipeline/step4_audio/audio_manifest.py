@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+音声生成のマニフェスト（出力ディレクトリごと）
+記事ごとにナレーションのハッシュ・出力ファイル・再生時間・サイズを記録し、
+再実行時に生成済みの記事をスキップできるようにする
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def narration_hash(narration, settings=None):
+    """ナレーション本文と音声に影響する設定からハッシュを作成"""
+    payload = json.dumps({
+        'narration': narration,
+        'settings': settings or {},
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioManifest:
+    """記事ごとの生成結果を記録するマニフェスト"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('articles', {})
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"⚠️  マニフェストが壊れているため作り直します: {e}")
+            return {}
+
+    def _save(self):
+        """一時ファイルに書き出してから置き換える（途中で落ちても壊れない）"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'articles': self.entries}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return self.entries.get(key)
+
+    def is_up_to_date(self, key, expected_hash):
+        """ハッシュが一致し、記録どおりのファイルが残っていれば生成済みとみなす"""
+        entry = self.get(key)
+        if entry is None or entry.get('narration_hash') != expected_hash:
+            return False
+
+        audio_path = os.path.join(self.output_dir, entry['audio_file'])
+        try:
+            return os.path.getsize(audio_path) == entry['bytes']
+        except OSError:
+            return False
+
+    def record(self, key, title, expected_hash, output_path, audio_path, duration):
+        """生成が完了した記事を記録（ファイルが確定した後に呼ぶ）"""
+        entry = {
+            'title': title,
+            'narration_hash': expected_hash,
+            'wav_file': os.path.basename(output_path),
+            'audio_file': os.path.basename(audio_path),
+            'duration': round(duration, 2),
+            'bytes': os.path.getsize(audio_path),
+            'completed_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.entries[key] = entry
+            self._save()
+        return entry
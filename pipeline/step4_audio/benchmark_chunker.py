@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+チャンク分割のベンチマーク
+旧方式（。のみで区切り先頭から詰める）と現在の分割方式を比較する
+- チャンク長のばらつき（平均・標準偏差・最小・最大）
+- --synthesize 指定時はVOICEVOXで実際に合成し、全体の所要時間を計測
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from generate_audio_from_json import (
+    CHUNK_SIZE,
+    MAX_WORKERS,
+    create_article_job,
+    run_chunk_scheduler,
+    split_text_into_chunks,
+)
+
+
+def legacy_split_text_into_chunks(text, max_length=CHUNK_SIZE):
+    """旧方式の分割（比較用）"""
+    chunks = []
+    current_chunk = ""
+
+    sentences = text.replace('\n', '').split('。')
+
+    for sentence in sentences:
+        if not sentence.strip():
+            continue
+
+        sentence = sentence.strip() + '。'
+
+        if len(current_chunk) + len(sentence) <= max_length:
+            current_chunk += sentence
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+            current_chunk = sentence
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def chunk_statistics(chunk_lists):
+    """チャンク長の統計を計算"""
+    lengths = [len(chunk) for chunks in chunk_lists for chunk in chunks]
+    return {
+        'chunks': len(lengths),
+        'mean': statistics.mean(lengths) if lengths else 0,
+        'stdev': statistics.pstdev(lengths) if lengths else 0,
+        'min': min(lengths) if lengths else 0,
+        'max': max(lengths) if lengths else 0,
+    }
+
+
+def measure_synthesis(narrations, chunker, max_workers):
+    """VOICEVOXで全記事を合成し、所要時間（秒）を返す（キャッシュは使わない）"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        jobs = [
+            create_article_job(i, f"article_{i}", text, os.path.join(temp_dir, f"article_{i}.wav"),
+                               chunks=chunker(text))
+            for i, text in enumerate(narrations, 1)
+        ]
+        started = time.monotonic()
+        results = run_chunk_scheduler(jobs, max_workers)
+        elapsed = time.monotonic() - started
+
+    failed = [r for r in results if not r['success']]
+    if failed:
+        print(f"⚠️  {len(failed)} 件の合成に失敗しました")
+    return elapsed
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("使用法: python3 benchmark_chunker.py <summarized_json> [--synthesize]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+    narrations = [a['narration_script'] for a in articles if a.get('narration_script')]
+    synthesize = '--synthesize' in sys.argv[2:]
+
+    print(f"📖 {len(narrations)} 件のナレーションで比較します\n")
+
+    chunkers = [
+        ('旧方式', legacy_split_text_into_chunks),
+        ('現在の方式', split_text_into_chunks),
+    ]
+
+    for name, chunker in chunkers:
+        stats = chunk_statistics([chunker(text) for text in narrations])
+        print(f"[{name}]")
+        print(f"  チャンク数: {stats['chunks']}")
+        print(f"  文字数: 平均 {stats['mean']:.1f} / 標準偏差 {stats['stdev']:.1f} / "
+              f"最小 {stats['min']} / 最大 {stats['max']}")
+
+        if synthesize:
+            max_workers = int(os.environ.get('VOICEVOX_MAX_WORKERS', MAX_WORKERS))
+            elapsed = measure_synthesis(narrations, chunker, max_workers)
+            print(f"  合成時間: {elapsed:.1f} 秒")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,59 @@
 """
 JSONファイルから音声を生成
 """
+import io
 import json
 import os
-import requests
 import sys
-import time
 import re
 import wave
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-VOICEVOX_URL = "http://localhost:50021"
+from audio_encoder import AUDIO_FORMATS, encode_wav
+from audio_manifest import AudioManifest, narration_hash
+from reading_normalizer import load_reading_normalizer
+from tts_cache import TTSCache, make_cache_key
+from voicevox_client import VoicevoxPool
+
+project_root = Path(__file__).parent.parent.parent
+
+VOICEVOX_BASE_PORT = 50021
 SPEAKER_ID = 3  # ずんだもん
 CHUNK_SIZE = 300  # 1つのチャンクの最大文字数
-MAX_WORKERS = 2  # 並列処理数（デフォルト2、環境変数で変更可能）
+MIN_CHUNK_SIZE = 50  # 合成速度から上限を下げる場合の下限
+MAX_CHUNK_SECONDS = 20  # 1チャンクの合成時間の上限（秒、実測速度が分かる場合に使用）
+MAX_WORKERS = 4  # エンジン1台あたりの同時リクエスト数の上限（実際の並列数はレイテンシから自動調整）
+WAV_BLOCK_FRAMES = 24000  # WAV結合時に一度に読み書きするフレーム数（24kHzで1秒分）
+SYNTHESIS_PARAMS = {}  # audio_queryの結果に上書きする合成パラメータ（例: {"speedScale": 1.1}）
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', str(project_root / 'cache' / 'tts'))
+TTS_CACHE_MAX_MB = 1024  # キャッシュの合計サイズ上限（0で無効）
+AUDIO_FORMAT = os.environ.get('AUDIO_FORMAT', 'mp3')  # 公開用の音声形式（wav / mp3 / aac / opus）
+AUDIO_ENCODER = os.environ.get('AUDIO_ENCODER', 'ffmpeg')  # エンコーダー（ffmpeg互換）
+AUDIO_BITRATE = os.environ.get('AUDIO_BITRATE', '64k')
+ENCODE_WORKERS = 2  # エンコードの並列数（記事単位）
+# 記事の音声が確定するたびにS3へアップロードする（0で無効、step5でまとめてアップロード）
+S3_UPLOAD_DURING_SYNTHESIS = os.environ.get('S3_UPLOAD_DURING_SYNTHESIS', '1') != '0'
+STREAM_QUEUE_SIZE = 3  # ストリーミングモードで音声生成に渡す前に溜めておける項目数（生成途中のテキスト断片・完成したナレーション）
+PENDING_CHUNKS_PER_WORKER = 2  # ワーカー1つあたりに投入しておける合成待ちチャンク数（これを超えると投入を待つ）
+STREAM_FIRST_CHUNK_SIZE = 80  # 生成途中のナレーションから最初に切り出すチャンクの目安（文字数）
+VOICEVOX_PREFLIGHT_FILE = os.environ.get(
+    'VOICEVOX_PREFLIGHT_FILE', str(project_root / 'cache' / 'voicevox_preflight.json')
+)  # step3のウォームアップで計測した合成速度
+REQUEST_TIMEOUT = 60  # 合成速度が未計測の場合のリクエストタイムアウト（秒）
+MIN_REQUEST_TIMEOUT = 30
+MAX_REQUEST_TIMEOUT = 300
+TIMEOUT_SAFETY_FACTOR = 4  # 1チャンクの想定合成時間に対する余裕（並列実行による遅延を含む）
+
+# 文末（。！？）とその直後の閉じ括弧までを1文とする
+SENTENCE_PATTERN = re.compile(r'[^。！？!?]+(?:[。！？!?]+[」』）)]*|$)')
+# 生成途中のテキストで確定した文の終わり（文末記号の後に別の文字が続く位置、または改行）
+COMPLETE_SENTENCE_END = re.compile(r'[。！？!?]+[」』）)]*(?=[^。！？!?」』）)])|\n')
+# 読点・閉じ括弧の直後で区切った句
+PHRASE_PATTERN = re.compile(r'[^、，,」』）)]+[、，,」』）)]*|[、，,」』）)]+')
 
 def sanitize_filename(title):
     """ファイル名として使用できる文字列に変換"""
@@ -28,185 +67,816 @@ def sanitize_filename(title):
         title = title[:100]
     return title
 
-def split_text_into_chunks(text, max_length=CHUNK_SIZE):
-    """テキストを指定文字数以下のチャンクに分割"""
+def split_into_sentences(text):
+    """テキストを文（。！？で終わる単位、閉じ括弧を含む）に分割"""
+    sentences = []
+    for line in text.split('\n'):
+        for match in SENTENCE_PATTERN.finditer(line):
+            sentence = match.group().strip()
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+def split_long_segment(segment, max_length):
+    """上限を超える文を読点・閉じ括弧の位置で句に分割し、それでも長い句は文字数で切る"""
+    if len(segment) <= max_length:
+        return [segment]
+
+    pieces = []
+    for phrase in PHRASE_PATTERN.findall(segment):
+        while len(phrase) > max_length:
+            pieces.append(phrase[:max_length])
+            phrase = phrase[max_length:]
+        if phrase:
+            pieces.append(phrase)
+    return pieces
+
+def load_voicevox_profile(speaker_id=SPEAKER_ID):
+    """step3のウォームアップで計測した結果を読み込む（話者が異なる・未計測の場合はNone）"""
+    try:
+        with open(VOICEVOX_PREFLIGHT_FILE, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if profile.get('speaker_id') != speaker_id or not profile.get('engines'):
+        return None
+    return profile
+
+def measured_chars_per_second(profile=None):
+    """
+    合成速度（文字/秒）を取得
+
+    VOICEVOX_CHARS_PER_SECONDの指定を優先し、なければウォームアップの計測値のうち
+    最も遅いエンジンの値を使う。どちらもなければNone。
+    """
+    chars_per_second = float(os.environ.get('VOICEVOX_CHARS_PER_SECOND', 0) or 0)
+    if chars_per_second > 0:
+        return chars_per_second
+    if profile:
+        return min(engine['chars_per_second'] for engine in profile['engines'].values())
+    return None
+
+def chunk_length_limit(chars_per_second=None, max_seconds=MAX_CHUNK_SECONDS):
+    """
+    1チャンクの最大文字数を決める
+
+    VOICEVOXの実測速度（文字/秒）が分かっている場合は、
+    1チャンクの合成時間がmax_secondsを超えないように上限を下げる。
+    """
+    if chars_per_second is None:
+        chars_per_second = measured_chars_per_second()
+    if not chars_per_second or chars_per_second <= 0:
+        return CHUNK_SIZE
+    return max(MIN_CHUNK_SIZE, min(CHUNK_SIZE, int(chars_per_second * max_seconds)))
+
+def request_timeout(max_length, chars_per_second=None):
+    """1チャンクの想定合成時間からリクエストのタイムアウトを決める"""
+    if not chars_per_second:
+        return REQUEST_TIMEOUT
+    expected = max_length / chars_per_second * TIMEOUT_SAFETY_FACTOR
+    return max(MIN_REQUEST_TIMEOUT, min(MAX_REQUEST_TIMEOUT, expected))
+
+def split_text_into_chunks(text, max_length=None):
+    """
+    テキストを指定文字数以下のチャンクに分割
+
+    文末（。！？）と閉じ括弧で区切った文を単位に、必要最小のチャンク数で
+    各チャンクの長さが均等になるように詰める。1文が上限を超える場合は
+    読点（、）や閉じ括弧の位置でさらに分割する。
+    チャンクごとの合成時間が揃うため、並列合成の待ち時間が偏りにくい。
+    """
+    if max_length is None:
+        max_length = chunk_length_limit()
+
+    return pack_segments(split_into_segments(text, max_length), max_length)
+
+def split_into_segments(text, max_length):
+    """テキストを文に分割し、上限を超える文は句に分割"""
+    segments = []
+    for sentence in split_into_sentences(text):
+        segments.extend(split_long_segment(sentence, max_length))
+    return segments
+
+def pack_segments(segments, max_length):
+    """文・句のリストを、必要最小のチャンク数で長さが均等になるようにチャンクへ詰める"""
+    if not segments:
+        return []
+
+    # 先頭から詰めた場合のチャンク数（これが必要最小数）
+    chunk_count = 1
+    current_length = 0
+    for segment in segments:
+        if current_length and current_length + len(segment) > max_length:
+            chunk_count += 1
+            current_length = 0
+        current_length += len(segment)
+
+    # チャンク数を固定したまま、長さの目標値からのずれ（二乗和）が最小になる区切り方を探す
+    prefix = [0]
+    for segment in segments:
+        prefix.append(prefix[-1] + len(segment))
+    target = prefix[-1] / chunk_count
+    n = len(segments)
+    infinity = float('inf')
+
+    cost = [[infinity] * (n + 1) for _ in range(chunk_count + 1)]
+    split_at = [[0] * (n + 1) for _ in range(chunk_count + 1)]
+    cost[0][0] = 0.0
+
+    for j in range(1, chunk_count + 1):
+        for i in range(1, n + 1):
+            start = i - 1
+            while start >= 0 and prefix[i] - prefix[start] <= max_length:
+                if cost[j - 1][start] < infinity:
+                    candidate = cost[j - 1][start] + (prefix[i] - prefix[start] - target) ** 2
+                    if candidate < cost[j][i]:
+                        cost[j][i] = candidate
+                        split_at[j][i] = start
+                start -= 1
+
     chunks = []
-    current_chunk = ""
+    end = n
+    for j in range(chunk_count, 0, -1):
+        start = split_at[j][end]
+        chunks.append(''.join(segments[start:end]))
+        end = start
+    chunks.reverse()
 
-    sentences = text.replace('\n', '').split('。')
+    return chunks
 
-    for sentence in sentences:
-        if not sentence.strip():
-            continue
+class StreamingChunker:
+    """
+    生成途中のテキストを受け取り、確定した文からチャンクを切り出す
+
+    最初のチャンクは音声合成を早く始められるよう first_length 文字程度で切り出し、
+    以降は max_length を超えない範囲で文を詰める。残りは finish() で均等に分割する。
+    normalizeを指定した場合は、確定した文を分割する前に適用する（読みの正規化など）。
+    """
+
+    def __init__(self, max_length, first_length=STREAM_FIRST_CHUNK_SIZE, normalize=None):
+        self.max_length = max_length
+        self.first_length = min(first_length, max_length)
+        self.normalize = normalize
+        self.buffer = ''  # 文の途中までのテキスト
+        self.pending = []  # 確定したがチャンクにしていない文・句
+        self.pending_length = 0
+        self.emitted = 0
+
+    def _flush_pending(self):
+        chunk = ''.join(self.pending)
+        self.pending = []
+        self.pending_length = 0
+        self.emitted += 1
+        return chunk
+
+    def feed(self, text):
+        """テキストを追加し、切り出せたチャンクのリストを返す"""
+        self.buffer += text
+        ends = [match.end() for match in COMPLETE_SENTENCE_END.finditer(self.buffer)]
+        if not ends:
+            return []
+
+        complete, self.buffer = self.buffer[:ends[-1]], self.buffer[ends[-1]:]
+        if self.normalize is not None:
+            complete = self.normalize(complete)
+        chunks = []
+        for segment in split_into_segments(complete, self.max_length):
+            if self.pending and self.pending_length + len(segment) > self.max_length:
+                chunks.append(self._flush_pending())
+            self.pending.append(segment)
+            self.pending_length += len(segment)
+            if not self.emitted and not chunks and self.pending_length >= self.first_length:
+                chunks.append(self._flush_pending())
+        return chunks
+
+    def finish(self):
+        """残りのテキストをすべてチャンクにして返す"""
+        rest = self.normalize(self.buffer) if self.normalize is not None else self.buffer
+        segments = self.pending + split_into_segments(rest, self.max_length)
+        self.buffer = ''
+        self.pending = []
+        self.pending_length = 0
+        chunks = pack_segments(segments, self.max_length)
+        self.emitted += len(chunks)
+        return chunks
+
+def append_wav_frames(output_wav, input_file, block_frames=WAV_BLOCK_FRAMES):
+    """WAVの音声データを一定フレーム数ずつ出力先に追記"""
+    with wave.open(input_file, 'rb') as input_wav:
+        while True:
+            frames = input_wav.readframes(block_frames)
+            if not frames:
+                break
+            output_wav.writeframesraw(frames)
+
+def create_article_job(index, title, text, output_path, chunks=None, max_length=None, open=False):
+    """
+    記事1件分の音声生成ジョブを作成（chunks省略時はテキストを分割）
+
+    openをTrueにした場合はナレーションの生成途中とみなし、chunksへの追加を受け付ける。
+    追加後にジョブをスケジューラーへ再度渡すと新しいチャンクの合成が始まり、
+    openをFalseにして渡すと記事が確定する。
+    """
+    if chunks is None:
+        chunks = split_text_into_chunks(text, max_length)
+    return {
+        'index': index,
+        'title': title,
+        'output_path': output_path,
+        'partial_path': output_path + '.part',  # 書き込み中のファイル
+        'chunks': chunks,
+        'pending': {},  # 到着済みだが順番待ちのチャンク {chunk_index: bytes}
+        'next_chunk': 0,  # 次に書き込むチャンク番号
+        'writer': None,
+        'open': open,  # 生成途中でチャンクが増える可能性がある
+        'submitted': 0,  # ワーカーに投入したチャンク数（投入スレッドのみが更新）
+        'processed': 0,  # 合成が終わったチャンク数（書き込みスレッドのみが更新）
+        'scheduled': False,  # スケジューラーが受け取り済み
+        'closed': False,  # すべてのチャンクの投入が終わった
+        'done': False,  # 出力ファイルの確定（または破棄）が終わった
+        'error': None,
+    }
+
+def get_voicevox_urls():
+    """
+    VOICEVOXエンジンのURL一覧を取得
+
+    VOICEVOX_URLSにカンマ区切りで指定するか、未指定の場合はstep3と同じく
+    VOICEVOX_ENGINE_COUNT台のエンジンがポート50021から連番で起動している前提とする。
+    """
+    urls = os.environ.get('VOICEVOX_URLS')
+    if urls:
+        return [url.strip() for url in urls.split(',') if url.strip()]
+
+    engine_count = int(os.environ.get('VOICEVOX_ENGINE_COUNT', 1))
+    return [f"http://localhost:{VOICEVOX_BASE_PORT + n}" for n in range(engine_count)]
+
+def create_voicevox_pool(max_workers, speaker_id=SPEAKER_ID):
+    """
+    VOICEVOXクライアントを作成
+
+    step3のウォームアップ計測値があれば、タイムアウトと並列数制御の初期値に使う。
+    読み辞書の単語は各エンジンのユーザー辞書に同期してから使う（キャッシュキーとマニフェストに
+    辞書のフィンガープリントを含めるため、同期できていないエンジンでは合成しない）。
+    """
+    profile = load_voicevox_profile(speaker_id)
+    chars_per_second = measured_chars_per_second(profile)
+    timeout = request_timeout(chunk_length_limit(chars_per_second), chars_per_second)
+
+    engine_speeds = {}
+    if profile:
+        engine_speeds = {url: engine['chars_per_second'] for url, engine in profile['engines'].items()}
+        print(f"🔧 ウォームアップ計測値: {chars_per_second:.1f} 文字/秒 → タイムアウト {timeout:.0f} 秒")
+
+    return VoicevoxPool(get_voicevox_urls(), max_concurrency=max_workers, timeout=timeout,
+                        chars_per_second=engine_speeds, words=load_reading_normalizer().words)
+
+def create_s3_uploader(output_dir):
+    """出力ディレクトリ名をプレフィックスにしたS3アップローダーを作成（無効の場合はNone）"""
+    if not S3_UPLOAD_DURING_SYNTHESIS:
+        return None
+    # boto3はアップロードする場合のみ読み込む
+    sys.path.insert(0, str(project_root / 'pipeline' / 'common'))
+    from s3_publisher import S3Uploader
+    return S3Uploader(os.path.basename(os.path.normpath(output_dir)))
+
+def create_tts_cache():
+    """環境変数の設定に従ってキャッシュを作成（無効の場合はNone）"""
+    max_mb = int(os.environ.get('TTS_CACHE_MAX_MB', TTS_CACHE_MAX_MB))
+    if max_mb <= 0:
+        return None
+    return TTSCache(TTS_CACHE_DIR, max_mb * 1024 * 1024)
+
+def synthesize_chunk_unit(client, job, chunk_index, speaker_id, cache=None, engine_version=None):
+    """(記事, チャンク) 単位の音声合成（ワーカースレッドで実行）"""
+    # 同じ記事の別チャンクが失敗していれば合成しない
+    if job['error'] is not None:
+        return None
+
+    chunk = job['chunks'][chunk_index]
+    total = '?' if job['open'] else len(job['chunks'])
+    label = f"  [{job['index']}] チャンク {chunk_index + 1}/{total}"
+
+    # 合成済みの音声があればVOICEVOXを呼ばない
+    cache_key = None
+    if cache is not None:
+        # 辞書の単語の読みはユーザー辞書で決まるため、辞書が変われば別のキーにする
+        cache_key = make_cache_key(chunk, speaker_id, engine_version, SYNTHESIS_PARAMS,
+                                   load_reading_normalizer().fingerprint)
+        audio = cache.get(cache_key)
+        if audio is not None:
+            print(f"{label} キャッシュを使用 ({len(chunk)} 文字)")
+            return audio
+
+    print(f"{label} を生成中... ({len(chunk)} 文字)")
+    audio = client.synthesize(chunk, speaker_id, SYNTHESIS_PARAMS)
+
+    if cache is not None:
+        cache.put(cache_key, audio)
+    return audio
+
+def write_ready_chunks(job):
+    """チャンク順で書き込める分だけ出力ファイルに追記"""
+    while job['next_chunk'] in job['pending']:
+        wav_file = io.BytesIO(job['pending'].pop(job['next_chunk']))
+
+        if job['writer'] is None:
+            # 最初のチャンクのパラメータで出力ファイルを開く
+            with wave.open(wav_file, 'rb') as first_wav:
+                params = first_wav.getparams()
+            wav_file.seek(0)
+            job['writer'] = wave.open(job['partial_path'], 'wb')
+            job['writer'].setparams(params)
+
+        append_wav_frames(job['writer'], wav_file)
+        job['next_chunk'] += 1
+
+def finalize_article_job(job):
+    """全チャンクを書き終えた出力ファイルを確定"""
+    job['writer'].close()
+    job['writer'] = None
+    os.replace(job['partial_path'], job['output_path'])
+    print(f"✓ 音声生成完了: {job['output_path']}")
+
+def abort_article_job(job):
+    """失敗した記事の書き込み途中のファイルを破棄"""
+    job['pending'].clear()
+    if job['writer'] is not None:
+        try:
+            job['writer'].close()
+        except Exception:
+            pass
+        job['writer'] = None
+    try:
+        os.remove(job['partial_path'])
+    except OSError:
+        pass
+
+def run_chunk_scheduler(jobs, max_workers, speaker_id=SPEAKER_ID, client=None, cache=None,
+                        on_complete=None):
+    """
+    全記事のチャンクを1つのワークキューに投入して並列合成する
+
+    記事単位ではなく (記事, チャンク) 単位でワーカーに割り当てるため、
+    長い記事が1つあっても他のワーカーが遊ばずに最後まで稼働し続ける。
+    キャッシュ済みのチャンクはVOICEVOXを呼ばずに再利用する。
+    合成済みのチャンクは一時ファイルを介さず、チャンク順に揃った時点で
+    記事ごとの出力ファイルへブロック単位で追記される。
+    実際の同時リクエスト数はクライアントがレイテンシを見て調整し、
+    複数エンジンがある場合は最も空いているエンジンに振り分ける。
+    投入済みで合成が終わっていないチャンク数に上限を設け、上限に達したら
+    jobsの読み進めを止める（ストリーミングモードでナレーション生成が合成より先行しすぎない）。
+
+    Args:
+        jobs: create_article_job() で作成したジョブのリストまたはイテラブル
+              （ジェネレーターの場合は受け取った順に合成を開始する。生成途中のジョブは
+              チャンクが増えるたびに同じジョブを再度渡し、最後にopen=Falseで渡す）
+        max_workers: エンジン1台あたりの同時リクエスト数の上限
+        speaker_id: 話者ID
+        client: VoicevoxPool（Noneの場合は新規作成）
+        cache: TTSCache（Noneの場合はキャッシュを使わない）
+        on_complete: 記事の出力ファイルが確定するたびに呼ばれる関数（引数はジョブ）
+
+    Returns:
+        list: 各記事の成功/失敗情報
+    """
+    results = []
 
-        sentence = sentence.strip() + '。'
+    owns_client = client is None
+    if owns_client:
+        client = create_voicevox_pool(max_workers, speaker_id)
 
-        if len(current_chunk) + len(sentence) <= max_length:
-            current_chunk += sentence
+    # キャッシュキーにはエンジンのバージョンを含める
+    engine_version = None
+    if cache is not None:
+        try:
+            engine_version = client.version()
+        except Exception as e:
+            print(f"⚠️  VOICEVOXのバージョン取得に失敗したためキャッシュを無効化します: {e}")
+            cache = None
+
+    # 完了したチャンク (ジョブ, チャンク番号, future)、(ジョブ, None, None)は記事の投入完了、Noneは全体の投入終了
+    completed = queue.Queue()
+    seen_jobs = []
+    feed_state = {'submitted': 0, 'error': None}
+    # ThreadPoolExecutorのキューは上限がないため、投入前にセマフォで合成待ちのチャンク数を制限する
+    pending_chunks = threading.BoundedSemaphore(client.max_concurrency * PENDING_CHUNKS_PER_WORKER)
+
+    def on_chunk_done(future, job, chunk_index):
+        pending_chunks.release()
+        completed.put((job, chunk_index, future))
+
+    with ThreadPoolExecutor(max_workers=client.max_concurrency) as executor:
+        def feed():
+            """ジョブを受け取り次第チャンクをワーカーに投入（jobsはジェネレーターでもよい）"""
+            try:
+                for job in jobs:
+                    if job['closed']:
+                        continue
+                    if not job['scheduled']:
+                        job['scheduled'] = True
+                        seen_jobs.append(job)
+
+                    # 前回渡された後に追加されたチャンクだけを投入
+                    while job['submitted'] < len(job['chunks']):
+                        chunk_index = job['submitted']
+                        pending_chunks.acquire()
+                        future = executor.submit(synthesize_chunk_unit, client, job, chunk_index,
+                                                 speaker_id, cache, engine_version)
+                        job['submitted'] += 1
+                        feed_state['submitted'] += 1
+                        future.add_done_callback(
+                            lambda f, job=job, chunk_index=chunk_index: on_chunk_done(f, job, chunk_index)
+                        )
+
+                    if not job['open']:
+                        job['closed'] = True
+                        completed.put((job, None, None))
+            except Exception as e:
+                feed_state['error'] = e
+            finally:
+                completed.put(None)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        # 完了したチャンクから順に記事ごとの出力ファイルへ書き込む
+        processed = 0
+        feeding = True
+        while feeding or processed < feed_state['submitted']:
+            item = completed.get()
+            if item is None:
+                feeding = False
+                continue
+
+            job, chunk_index, future = item
+            if chunk_index is not None:
+                processed += 1
+                job['processed'] += 1
+                try:
+                    audio = future.result()
+                    if job['error'] is None:
+                        job['pending'][chunk_index] = audio
+                        write_ready_chunks(job)
+                except Exception as e:
+                    if job['error'] is None:
+                        job['error'] = str(e)
+                        print(f"✗ [{job['index']}] 音声生成エラー: {e}\n")
+                        traceback.print_exc()
+                        abort_article_job(job)
+            del item, future
+
+            # 投入が終わり、すべてのチャンクの合成が終わった記事を確定
+            if not job['closed'] or job['processed'] < job['submitted'] or job['done']:
+                continue
+            job['done'] = True
+            if job['error'] is None and job['submitted'] == 0:
+                job['error'] = 'チャンクがありません'
+            if job['error'] is not None:
+                abort_article_job(job)
+                continue
+            try:
+                finalize_article_job(job)
+                if on_complete is not None:
+                    on_complete(job)
+            except Exception as e:
+                job['error'] = str(e)
+                print(f"✗ [{job['index']}] 音声ファイルの確定に失敗しました: {e}\n")
+                abort_article_job(job)
+
+        feeder.join()
+
+    stats = client.stats()
+    print(f"📊 VOICEVOX: {stats['requests']} リクエスト / エラー {stats['errors']} 件 / "
+          f"平均 {stats['avg_latency']:.2f} 秒 / {stats['chars_per_second']:.1f} 文字/秒 / "
+          f"最大同時実行 {stats['peak_concurrency']} (最終上限 {stats['concurrency_limit']})")
+    if stats['engines'] > 1:
+        print(f"📊 VOICEVOXエンジン: 正常 {stats['healthy_engines']}/{stats['engines']} 台 / "
+              f"振り替え {stats['reroutes']} 回")
+        for url, engine_stats in stats['per_engine']:
+            print(f"    {url}: {engine_stats['requests']} リクエスト / "
+                  f"{engine_stats['chars_per_second']:.1f} 文字/秒")
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"📊 TTSキャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']} / "
+              f"{cache_stats['entries']} 件 ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+    if owns_client:
+        client.close()
+
+    if feed_state['error'] is not None:
+        raise feed_state['error']
+
+    for job in seen_jobs:
+        if job['error'] is None:
+            results.append({
+                'success': True,
+                'index': job['index'],
+                'title': job['title'],
+                'output_path': job['output_path']
+            })
         else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = sentence
+            results.append({
+                'success': False,
+                'index': job['index'],
+                'title': job['title'],
+                'error': job['error']
+            })
+
+    return results
+
+def get_wav_duration(wav_path):
+    """WAVファイルの再生時間（秒）"""
+    with wave.open(wav_path, 'rb') as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+def generate_audio_for_articles(articles, output_dir, total):
+    """
+    記事を受け取り次第チャンクに分割して音声を生成
+
+    出力ディレクトリのマニフェストに記録済みで、ナレーションと設定が変わっていない
+    記事はスキップし、未生成・内容が変わった記事のみを生成する。
+
+    確定した音声ファイル（生成済みでスキップした記事を含む）は、S3へのアップロードが
+    有効な場合は残りの記事の合成と並行してアップロードする。
+
+    記事の代わりに生成途中のテキスト {'title': ..., 'stream_text': ...} を渡すと、
+    確定した文からチャンクを切り出して合成を始める。その後に同じインデックスで
+    完成した記事を渡すと残りをチャンクにして記事を確定する（完成した記事が
+    届かないまま終わった場合は失敗扱い）。
+
+    Args:
+        articles: (インデックス, 記事) のイテラブル（ジェネレーターの場合は届いた順に合成を開始）
+        output_dir: 出力ディレクトリ
+        total: 記事の総数（表示用）
+
+    Returns:
+        list: 各記事の成功/失敗情報
+    """
+    # 環境変数から同時リクエスト数の上限を取得（デフォルトはMAX_WORKERS）
+    max_workers = int(os.environ.get('VOICEVOX_MAX_WORKERS', MAX_WORKERS))
+    voicevox_urls = get_voicevox_urls()
 
-    if current_chunk:
-        chunks.append(current_chunk)
+    audio_format = AUDIO_FORMAT.lower()
+    if audio_format != 'wav' and audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"未対応のAUDIO_FORMATです: {AUDIO_FORMAT}")
 
-    return chunks
+    # ウォームアップで計測した合成速度からチャンクの上限を決める
+    max_length = chunk_length_limit(measured_chars_per_second(load_voicevox_profile()))
 
-def concatenate_wav_files(wav_files, output_file):
-    """複数のWAVファイルを正しく結合"""
-    if not wav_files:
-        return False
-
-    # 最初のファイルのパラメータを読み取る
-    with wave.open(wav_files[0], 'rb') as first_wav:
-        params = first_wav.getparams()
-
-    # 出力ファイルを開く
-    with wave.open(output_file, 'wb') as output_wav:
-        output_wav.setparams(params)
-
-        # 各WAVファイルのデータを追加
-        for wav_file in wav_files:
-            with wave.open(wav_file, 'rb') as input_wav:
-                output_wav.writeframes(input_wav.readframes(input_wav.getnframes()))
-
-    return True
-
-def generate_audio_with_chunking(text, output_path, speaker_id=SPEAKER_ID):
-    """テキストをチャンクに分割して音声生成"""
-    chunks = split_text_into_chunks(text)
-
-    print(f"  テキストを {len(chunks)} チャンクに分割")
-
-    temp_wav_files = []
-
-    for i, chunk in enumerate(chunks, 1):
-        print(f"  チャンク {i}/{len(chunks)} を生成中... ({len(chunk)} 文字)")
-
-        # 音声合成用のクエリを作成
-        query_response = requests.post(
-            f"{VOICEVOX_URL}/audio_query",
-            params={"text": chunk, "speaker": speaker_id},
-            timeout=60
-        )
-        query_response.raise_for_status()
-
-        # 音声合成
-        synthesis_response = requests.post(
-            f"{VOICEVOX_URL}/synthesis",
-            params={"speaker": speaker_id},
-            json=query_response.json(),
-            timeout=60
-        )
-        synthesis_response.raise_for_status()
-
-        # 一時ファイルに保存（スレッドIDを含めて一意にする）
-        thread_id = threading.get_ident()
-        temp_file = f"/tmp/chunk_{i}_{os.getpid()}_{thread_id}.wav"
-        with open(temp_file, 'wb') as f:
-            f.write(synthesis_response.content)
-        temp_wav_files.append(temp_file)
-
-        time.sleep(0.5)
-
-    # WAVファイルを正しく結合
-    print(f"  音声ファイルを結合中...")
-    concatenate_wav_files(temp_wav_files, output_path)
-
-    # 一時ファイルを削除
-    for temp_file in temp_wav_files:
-        try:
-            os.remove(temp_file)
-        except:
-            pass
+    # 英字表記を辞書とルールで読み上げ用に変換してからチャンクに分割する
+    normalizer = load_reading_normalizer()
+
+    print(f"🔧 VOICEVOXエンジン: {', '.join(voicevox_urls)}")
+    print(f"🔧 同時リクエスト数の上限: エンジン1台あたり {max_workers}（レイテンシに応じて自動調整）")
+    print(f"🔧 チャンクの上限: {max_length} 文字")
+    print(f"🔧 読み辞書: {len(normalizer.words)} 語")
 
-    print(f"✓ 音声生成完了: {output_path}")
+    os.makedirs(output_dir, exist_ok=True)
 
-def process_single_article(article, index, total, output_dir):
-    """1つの記事を処理（並列処理用）"""
-    title = article.get('title', f'article_{index}')
-    narration = article.get('narration_script', '')
+    # 出力に影響する設定が変わった場合も再生成する
+    manifest = AudioManifest(output_dir)
+    settings = {
+        'speaker': SPEAKER_ID,
+        'params': SYNTHESIS_PARAMS,
+        'format': audio_format,
+        'bitrate': AUDIO_BITRATE if audio_format != 'wav' else None,
+        'readings': normalizer.fingerprint,
+    }
+
+    # 記事の音声が揃い次第、エンコードとマニフェストへの記録を別スレッドで行う
+    finish_workers = 1
+    if audio_format != 'wav':
+        finish_workers = int(os.environ.get('AUDIO_ENCODE_WORKERS', ENCODE_WORKERS))
+        print(f"🔧 出力形式: {audio_format} ({AUDIO_BITRATE}, {AUDIO_ENCODER}, {finish_workers} 並列)")
+    uploader = create_s3_uploader(output_dir)
+    if uploader is not None:
+        print(f"🔧 S3アップロード: 音声が確定するたびに s3://{uploader.bucket}/{uploader.prefix}/ へ")
+    print()
 
-    if not narration:
-        return {
-            'success': False,
-            'index': index,
-            'title': title,
-            'error': 'ナレーション原稿がありません'
-        }
+    results = []
+    streaming_jobs = {}  # ナレーションの生成途中の記事 {インデックス: ジョブ}
+
+    def iter_jobs():
+        """合成が必要な記事だけをジョブにして渡す"""
+        for i, article in articles:
+            title = article.get('title', f'article_{i}')
+
+            if 'stream_text' in article:
+                # 生成途中のテキストから確定した文をチャンクにして合成を始める
+                job = streaming_jobs.get(i)
+                if job is None:
+                    safe_title = sanitize_filename(title)
+                    output_path = os.path.join(output_dir, f"{safe_title}.wav")
+                    print(f"[{i}/{total}] {title}（ナレーション生成中に合成開始）")
+                    job = create_article_job(i, title, '', output_path, chunks=[], open=True)
+                    job['manifest_key'] = safe_title
+                    job['chunker'] = StreamingChunker(max_length, normalize=normalizer.normalize)
+                    streaming_jobs[i] = job
+                new_chunks = job['chunker'].feed(article['stream_text'])
+                if new_chunks:
+                    job['chunks'].extend(new_chunks)
+                    yield job
+                continue
+
+            narration = article.get('narration_script', '')
+
+            if i in streaming_jobs:
+                # ナレーションが完成したら残りをチャンクにして記事を確定
+                job = streaming_jobs.pop(i)
+                job['chunks'].extend(job['chunker'].finish())
+                job['narration_hash'] = narration_hash(narration, settings)
+                job['open'] = False
+                print(f"  [{i}] ナレーション完成: {len(narration)} 文字 / {len(job['chunks'])} チャンク")
+                yield job
+                continue
+
+            if not narration:
+                results.append({
+                    'success': False,
+                    'index': i,
+                    'title': title,
+                    'error': 'ナレーション原稿がありません'
+                })
+                continue
+
+            # ファイル名をサニタイズ
+            safe_title = sanitize_filename(title)
+            output_path = os.path.join(output_dir, f"{safe_title}.wav")
+            expected_hash = narration_hash(narration, settings)
+
+            print(f"[{i}/{total}] {title}")
+
+            if manifest.is_up_to_date(safe_title, expected_hash):
+                entry = manifest.get(safe_title)
+                print(f"  ⏭️  生成済みのためスキップ ({entry['audio_file']})")
+                if uploader is not None:
+                    uploader.submit(os.path.join(output_dir, entry['audio_file']))
+                results.append({
+                    'success': True,
+                    'skipped': True,
+                    'index': i,
+                    'title': title,
+                    'output_path': output_path,
+                    'audio_path': os.path.join(output_dir, entry['audio_file'])
+                })
+                continue
+
+            job = create_article_job(i, title, normalizer.normalize(narration), output_path,
+                                     max_length=max_length)
+            job['manifest_key'] = safe_title
+            job['narration_hash'] = expected_hash
+            print(f"  文字数: {len(narration)} 文字 / {len(job['chunks'])} チャンク")
+            yield job
+
+        # 完成したナレーションが届かなかった記事（生成失敗）は破棄する
+        for job in streaming_jobs.values():
+            job['error'] = 'ナレーション生成に失敗しました'
+            job['open'] = False
+            yield job
+
+    finish_executor = ThreadPoolExecutor(max_workers=finish_workers)
+    finish_futures = {}
+
+    def finish_article(job):
+        audio_path = job['output_path']
+        if audio_format != 'wav':
+            audio_path = encode_wav(job['output_path'], audio_format, AUDIO_ENCODER, AUDIO_BITRATE)
+            print(f"✓ エンコード完了: {audio_path}")
+        manifest.record(job['manifest_key'], job['title'], job['narration_hash'],
+                        job['output_path'], audio_path, get_wav_duration(job['output_path']))
+        if uploader is not None:
+            uploader.submit(audio_path)
+        return audio_path
+
+    def on_complete(job):
+        finish_futures[job['index']] = finish_executor.submit(finish_article, job)
+
+    # 全記事のチャンクを1つのワークキューで並列合成
+    try:
+        results.extend(run_chunk_scheduler(iter_jobs(), max_workers, cache=create_tts_cache(),
+                                           on_complete=on_complete))
+    finally:
+        finish_executor.shutdown(wait=True)
+    results.sort(key=lambda r: r['index'])
+
+    # エンコード結果を反映
+    for result in results:
+        if not result['success'] or result.get('skipped'):
+            continue
+        try:
+            result['audio_path'] = finish_futures[result['index']].result()
+        except Exception as e:
+            result['success'] = False
+            result['error'] = f"後処理エラー（エンコード・マニフェスト記録）: {e}"
+
+    for result in results:
+        if not result['success']:
+            print(f"⚠️  [{result['index']}/{total}] {result['title']} - {result['error']}")
+
+    # 合成が終わった時点で残っているアップロードの完了を待つ（失敗はstep5で再試行される）
+    if uploader is not None:
+        uploads = uploader.wait()
+        failed_uploads = [u for u in uploads if not u['success']]
+        for upload in failed_uploads:
+            print(f"⚠️  S3アップロード失敗: {upload['key']} - {upload['error']}")
+        print(f"✓ S3アップロード: {len(uploads) - len(failed_uploads)}/{len(uploads)} 件")
 
-    print(f"{'='*60}")
-    print(f"[{index}/{total}] {title}")
-    print(f"{'='*60}")
-    print(f"文字数: {len(narration)} 文字\n")
+    # 成功した件数を集計
+    success_count = sum(1 for r in results if r['success'])
+    skipped_count = sum(1 for r in results if r.get('skipped'))
 
-    # ファイル名をサニタイズ
-    safe_title = sanitize_filename(title)
-    output_path = os.path.join(output_dir, f"{safe_title}.wav")
+    print(f"✓ 完了: {success_count}/{total} 件の音声ファイルを生成しました"
+          f"（うち生成済みスキップ {skipped_count} 件）")
 
-    try:
-        generate_audio_with_chunking(narration, output_path)
-        print()
-        return {
-            'success': True,
-            'index': index,
-            'title': title,
-            'output_path': output_path
-        }
-    except Exception as e:
-        print(f"✗ 音声生成エラー: {e}\n")
-        import traceback
-        traceback.print_exc()
-        return {
-            'success': False,
-            'index': index,
-            'title': title,
-            'error': str(e)
-        }
+    return results
 
 def generate_audio_from_json(input_json_path, output_dir):
-    """JSONファイルから音声ファイルを生成（並列処理版）"""
+    """JSONファイルから音声ファイルを生成（チャンク単位の並列処理版）"""
     print(f"📖 記事を読み込み中: {input_json_path}")
 
     with open(input_json_path, 'r', encoding='utf-8') as f:
         articles = json.load(f)
 
-    # 環境変数から並列数を取得（デフォルトはMAX_WORKERS）
-    max_workers = int(os.environ.get('VOICEVOX_MAX_WORKERS', MAX_WORKERS))
-
     print(f"✓ {len(articles)} 件の記事を読み込みました")
-    print(f"🔧 並列処理数: {max_workers}\n")
 
-    os.makedirs(output_dir, exist_ok=True)
+    return generate_audio_for_articles(enumerate(articles, 1), output_dir, len(articles))
+
+def generate_audio_streaming(topics_file, summarized_json, output_dir, topics=None):
+    """
+    ナレーション生成（step2）と音声生成を同じプロセスで並行実行
+
+    step2はGeminiの出力をストリーミングで受け取り、届いたテキストを
+    上限付きキューへ渡す。合成待ちのチャンクが上限に達すると音声生成側がキューを
+    読み進めなくなり、キューが一杯になるとstep2の受信も待つ。音声生成側は文が確定するたびにチャンクを切り出して
+    合成を始めるため、記事ごとの最初の音声はナレーション全体の生成を待たずに
+    最初の数文が届いた時点で合成される。
+    LLMの待ち時間とVOICEVOXの合成時間が重なるため、全体の所要時間は
+    両者の合計ではなくおおよそ長い方になる。
+    summarized.jsonは従来どおりstep2の完了時に書き出される。
+    topicsを指定した場合はtopics_fileを読まずにそのニュース概要を使う。
+    """
+    # step2のモジュールはストリーミングモードでのみ読み込む
+    sys.path.insert(0, str(project_root / 'pipeline' / 'step2_summarize'))
+    from generate_detailed_narration import generate_narrations_from_topics
+
+    if topics is None:
+        with open(topics_file, 'r', encoding='utf-8') as f:
+            topics = json.load(f)
+    total = len(topics)
+
+    queue_size = int(os.environ.get('STREAM_QUEUE_SIZE', STREAM_QUEUE_SIZE))
+    narration_queue = queue.Queue(maxsize=queue_size)
+    producer_state = {'error': None}
+
+    def on_narration(index, narration):
+        # キューが一杯の場合は音声生成が追いつくまで待つ
+        narration_queue.put((index, narration))
+
+    def on_text(index, topic, text):
+        narration_queue.put((index, {'title': topic['title'], 'stream_text': text}))
+
+    def produce():
+        try:
+            generate_narrations_from_topics(topics_file, summarized_json,
+                                            on_narration=on_narration, on_text=on_text, topics=topics)
+        except Exception as e:
+            producer_state['error'] = e
+        finally:
+            narration_queue.put(None)
 
-    results = []
+    def iter_narrations():
+        while True:
+            item = narration_queue.get()
+            if item is None:
+                return
+            yield item
 
-    # 並列処理で音声生成
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 各記事の処理をスレッドプールに投入
-        futures = {
-            executor.submit(process_single_article, article, i, len(articles), output_dir): i
-            for i, article in enumerate(articles, 1)
-        }
+    print(f"🔀 ストリーミングモード: ナレーション生成と音声生成を並行実行（キュー上限 {queue_size} 項目）\n")
 
-        # 完了した順に結果を取得
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
 
-            if not result['success']:
-                if 'error' in result:
-                    print(f"⚠️  [{result['index']}/{len(articles)}] {result['title']} - {result['error']}\n")
+    results = generate_audio_for_articles(iter_narrations(), output_dir, total)
+    producer.join()
 
-    # 成功した件数を集計
-    success_count = sum(1 for r in results if r['success'])
+    if producer_state['error'] is not None:
+        raise producer_state['error']
 
-    print(f"✓ 完了: {success_count}/{len(articles)} 件の音声ファイルを生成しました")
+    return results
 
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == '--stream':
+        if len(sys.argv) < 5:
+            print("使用法: python3 generate_audio_from_json.py --stream <topics_json> <summarized_json> <output_dir>")
+            sys.exit(1)
+        generate_audio_streaming(sys.argv[2], sys.argv[3], sys.argv[4])
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print("使用法: python3 generate_audio_from_json.py <input_json> <output_dir>")
+        print("       python3 generate_audio_from_json.py --stream <topics_json> <summarized_json> <output_dir>")
         sys.exit(1)
 
     input_json = sys.argv[1]
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+読み上げ用のテキスト正規化（LLMを使わない決定的な変換）
+- 辞書ファイル（reading_dictionary.json）の単語は英字表記のまま残し、読みとアクセントは
+  VOICEVOXのユーザー辞書（step3で同期）に任せる（表記ゆれは辞書の表記にそろえる）
+- 辞書にない英字の略語（AWS、EC2、HTML5など）をアルファベット読みに変換
+- バージョン番号・ドメイン名を読み上げやすい形に変換
+- 正規表現は辞書の読み込み時に一度だけコンパイルする
+"""
+import hashlib
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+READING_DICTIONARY_FILE = project_root / 'reading_dictionary.json'
+RULES_VERSION = 4  # 変換ルールを変更したら上げる（生成済み音声の作り直しに使う）
+
+ALPHABET_READINGS = {
+    'A': 'エー', 'B': 'ビー', 'C': 'シー', 'D': 'ディー', 'E': 'イー', 'F': 'エフ',
+    'G': 'ジー', 'H': 'エイチ', 'I': 'アイ', 'J': 'ジェー', 'K': 'ケー', 'L': 'エル',
+    'M': 'エム', 'N': 'エヌ', 'O': 'オー', 'P': 'ピー', 'Q': 'キュー', 'R': 'アール',
+    'S': 'エス', 'T': 'ティー', 'U': 'ユー', 'V': 'ブイ', 'W': 'ダブリュー', 'X': 'エックス',
+    'Y': 'ワイ', 'Z': 'ゼット',
+}
+# 略語に含まれる数字は英語で読む（EC2 → イーシーツー）
+ENGLISH_DIGIT_READINGS = {
+    '0': 'ゼロ', '1': 'ワン', '2': 'ツー', '3': 'スリー', '4': 'フォー',
+    '5': 'ファイブ', '6': 'シックス', '7': 'セブン', '8': 'エイト', '9': 'ナイン',
+}
+# バージョン番号の小数点以下は1桁ずつ読む（3.13 → 3テンイチサン）
+JAPANESE_DIGIT_READINGS = {
+    '0': 'ゼロ', '1': 'イチ', '2': 'ニ', '3': 'サン', '4': 'ヨン',
+    '5': 'ゴ', '6': 'ロク', '7': 'ナナ', '8': 'ハチ', '9': 'キュウ',
+}
+# ドメイン名の末尾のラベルの読み（単独の単語としては変換しない: dev環境、.NET など）
+DOMAIN_SUFFIX_READINGS = {
+    'com': 'コム', 'net': 'ネット', 'org': 'オーグ', 'io': 'アイオー', 'jp': 'ジェーピー',
+    'dev': 'デブ', 'ai': 'エーアイ', 'app': 'アップ', 'co': 'シーオー',
+}
+
+# 英字・数字の直後に続くバージョン番号（Python 3.13、v2.0.1 など）
+VERSION_PATTERN = re.compile(
+    r'(?:(?<=[A-Za-z])\s?|(?<![A-Za-z0-9])[vV])(\d+(?:\.\d+)+)(?![.\d])'
+)
+# ドメイン名（https://github.com/... → github ドット com）
+DOMAIN_PATTERN = re.compile(
+    r'(?:https?://)?((?:[A-Za-z0-9-]+\.)+(?:' + '|'.join(DOMAIN_SUFFIX_READINGS) + r'))'
+    r'(?![A-Za-z0-9])(?:/[A-Za-z0-9_\-./?%&=#~]*)?'
+)
+# .NET（ASP.NET を含む）はドットネットと読む（略語のルールではエヌイーティーになるため）
+DOTNET_PATTERN = re.compile(r'\.NET(?![A-Za-z0-9])')
+# 辞書にない英大文字の略語（数字付きを含む）
+ABBREVIATION_PATTERN = re.compile(r'(?<![A-Za-z0-9])([A-Z]{2,6}\d{0,2}|[A-Z]\d{1,2})(?![A-Za-z0-9])')
+# 読みの直後に付いた同じ読みの括弧書き（ギットハブ（ギットハブ））
+DUPLICATED_READING_PATTERN = re.compile(r'([ァ-ヴー]+)\s*[（(]\1[）)]')
+REPEATED_SPACES_PATTERN = re.compile(r' {2,}')
+
+
+def read_version(match):
+    major, *rest = match.group(1).split('.')
+    decimals = 'テン'.join(''.join(JAPANESE_DIGIT_READINGS[d] for d in part) for part in rest)
+    return f" バージョン {major}テン{decimals}"
+
+
+def read_abbreviation(match):
+    return ''.join(ALPHABET_READINGS.get(c) or ENGLISH_DIGIT_READINGS[c] for c in match.group(1))
+
+
+def read_domain(match):
+    labels = match.group(1).split('.')
+    # 末尾から続くサフィックス（co.jp など）だけを読みに変換し、残りのラベルは辞書・ルールに任せる
+    end = len(labels)
+    while end > 1 and labels[end - 1].lower() in DOMAIN_SUFFIX_READINGS:
+        end -= 1
+    labels[end:] = [DOMAIN_SUFFIX_READINGS[label.lower()] for label in labels[end:]]
+    return ' ドット '.join(labels)
+
+
+class ReadingNormalizer:
+    """
+    ルールで英字表記を読み上げ用のカタカナに変換する
+
+    辞書の単語はVOICEVOXのユーザー辞書で読み・アクセントを付けるため、ここでは
+    カタカナにせず辞書の表記にそろえるだけにし、略語のルールの対象からも外す。
+    """
+
+    def __init__(self, words, fingerprint=''):
+        self.words = words
+        self.fingerprint = fingerprint
+        self.surfaces = {word['surface'].lower(): word['surface'] for word in words}
+        self.readings = {word['surface'].lower(): word['pronunciation'] for word in words}
+
+        # 長い表記を優先してマッチさせる（Node.js を Node より先に）
+        # 直後に同じ読みの括弧書き（Laravel（ララベル））があれば読みが重複するため取り除く
+        surfaces = sorted(self.surfaces, key=len, reverse=True)
+        self.word_pattern = None
+        if surfaces:
+            self.word_pattern = re.compile(
+                r'(?<![A-Za-z0-9])(' + '|'.join(re.escape(s) for s in surfaces) + r')(?![A-Za-z0-9])'
+                r'(?:\s*[（(]([ァ-ヴー]+)[）)])?',
+                re.IGNORECASE
+            )
+
+    def _dictionary_word(self, match):
+        key = match.group(1).lower()
+        if match.group(2) is not None and match.group(2) != self.readings[key]:
+            return self.surfaces[key] + match.group(0)[len(match.group(1)):]
+        return self.surfaces[key]
+
+    def _abbreviation(self, match):
+        # 辞書の単語（NVIDIAなど）はユーザー辞書の読みを使う
+        if match.group(1).lower() in self.surfaces:
+            return match.group(0)
+        return read_abbreviation(match)
+
+    def normalize(self, text):
+        """テキストを読み上げ用に変換"""
+        text = VERSION_PATTERN.sub(read_version, text)
+        text = DOMAIN_PATTERN.sub(read_domain, text)
+        text = DOTNET_PATTERN.sub('ドットネット', text)
+        if self.word_pattern is not None:
+            text = self.word_pattern.sub(self._dictionary_word, text)
+        text = ABBREVIATION_PATTERN.sub(self._abbreviation, text)
+        text = DUPLICATED_READING_PATTERN.sub(r'\1', text)
+        return REPEATED_SPACES_PATTERN.sub(' ', text)
+
+
+def load_words(dictionary_file=READING_DICTIONARY_FILE):
+    """辞書ファイルの単語リストを読み込む（ファイルがない場合は空）"""
+    try:
+        with open(dictionary_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('words', [])
+    except FileNotFoundError:
+        return []
+
+
+@lru_cache(maxsize=None)
+def load_reading_normalizer(dictionary_file=READING_DICTIONARY_FILE):
+    """辞書ファイルから正規化エンジンを作成（プロセス内で使い回す）"""
+    words = load_words(dictionary_file)
+    payload = json.dumps({'rules': RULES_VERSION, 'words': words}, ensure_ascii=False, sort_keys=True)
+    fingerprint = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    return ReadingNormalizer(words, fingerprint)
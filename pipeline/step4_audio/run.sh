@@ -1,8 +1,14 @@
 #!/bin/bash
 # Step 4: 音声ファイル生成
+# --stream を指定するとstep2（ナレーション生成）と音声生成を同じプロセスで並行実行する
 
 set -e
 
+STREAM_MODE=0
+if [ "$1" = "--stream" ]; then
+    STREAM_MODE=1
+fi
+
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(cd "$SCRIPT_DIR/../.." && pwd)"
 
@@ -45,14 +51,24 @@ if [ -z "$LATEST_DIR" ]; then
 fi
 
 SUMMARIZED_JSON="${LATEST_DIR}summarized.json"
-if [ ! -f "$SUMMARIZED_JSON" ]; then
-    echo "✗ summarized.jsonが見つかりません"
-    echo "  先に step2_summarize.sh を実行してください"
-    exit 1
+LATEST_TOPICS="${LATEST_DIR}topics.json"
+
+if [ $STREAM_MODE -eq 1 ]; then
+    if [ ! -f "$LATEST_TOPICS" ]; then
+        echo "✗ topics.jsonが見つかりません"
+        echo "  先に step1を実行してください"
+        exit 1
+    fi
+    echo "Input: $LATEST_TOPICS (ストリーミングモード)"
+else
+    if [ ! -f "$SUMMARIZED_JSON" ]; then
+        echo "✗ summarized.jsonが見つかりません"
+        echo "  先に step2_summarize.sh を実行してください"
+        exit 1
+    fi
+    echo "Input: $SUMMARIZED_JSON"
 fi
 
-echo "Input: $SUMMARIZED_JSON"
-
 # タイムスタンプを抽出（data/20251201_154625/ → 20251201_154625）
 TIMESTAMP=$(basename "$LATEST_DIR")
 OUTPUT_DIR="output/${TIMESTAMP}"
@@ -60,9 +76,13 @@ OUTPUT_DIR="output/${TIMESTAMP}"
 mkdir -p "$OUTPUT_DIR"
 echo "Output directory: $OUTPUT_DIR"
 
-# 音声生成
-python3 -u pipeline/step4_audio/generate_audio_from_json.py "$SUMMARIZED_JSON" "$OUTPUT_DIR"
-AUDIO_EXIT_CODE=$?
+# 音声生成（set -e で中断しないよう終了コードを取得）
+AUDIO_EXIT_CODE=0
+if [ $STREAM_MODE -eq 1 ]; then
+    python3 -u pipeline/step4_audio/generate_audio_from_json.py --stream "$LATEST_TOPICS" "$SUMMARIZED_JSON" "$OUTPUT_DIR" || AUDIO_EXIT_CODE=$?
+else
+    python3 -u pipeline/step4_audio/generate_audio_from_json.py "$SUMMARIZED_JSON" "$OUTPUT_DIR" || AUDIO_EXIT_CODE=$?
+fi
 
 echo ""
 echo "✓ Audio generation completed (exit code: $AUDIO_EXIT_CODE)"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+合成済み音声チャンクのローカルキャッシュ
+- (テキスト, 話者ID, エンジンバージョン, 合成パラメータ, 読み辞書) のハッシュをキーに保存
+- 合計サイズの上限を超えたら最終利用が古いものから削除（LRU）
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+def make_cache_key(text, speaker_id, engine_version, params=None, dictionary=''):
+    """キャッシュキー（SHA-256）を作成（dictionaryはユーザー辞書に登録した読み辞書のフィンガープリント）"""
+    payload = json.dumps({
+        'text': text,
+        'speaker': speaker_id,
+        'engine_version': engine_version,
+        'params': params or {},
+        'dictionary': dictionary,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """サイズ上限付きのコンテンツアドレス型キャッシュ"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (最終利用時刻, サイズ)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.wav"
+
+    def _scan(self):
+        """既存のキャッシュファイルを読み込む"""
+        for path in self.cache_dir.glob('*/*.wav'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            self._entries[path.stem] = (stat.st_mtime, stat.st_size)
+
+    def get(self, key):
+        """キャッシュから取得（なければNone）"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            return None
+
+        # 最終利用時刻を更新（LRUの判定に使用）
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+        with self._lock:
+            self._entries[key] = (now, len(data))
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """キャッシュに保存し、上限を超えた分を削除"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 書き込み途中のファイルを読まないよう一時ファイル経由で置き換える
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._entries[key] = (time.time(), len(data))
+            self._evict()
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで古いものから削除（ロック取得済みで呼ぶ）"""
+        total = sum(size for _, size in self._entries.values())
+        if total <= self.max_bytes:
+            return
+
+        for key, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._entries[key]
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': sum(size for _, size in self._entries.values()),
+            }
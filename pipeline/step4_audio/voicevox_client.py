@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+VOICEVOXエンジン用のHTTPクライアント
+- コネクションプール（keep-alive）を再利用
+- リクエストごとのレイテンシを計測
+- レイテンシに応じて同時リクエスト数を自動調整（バックプレッシャー）
+- 複数エンジンへの負荷分散と障害時の振り替え
+- 読み辞書の単語をエンジンのユーザー辞書に同期してから使う
+"""
+import threading
+import time
+import unicodedata
+
+import requests
+from requests.adapters import HTTPAdapter
+
+VOICEVOX_URL = "http://localhost:50021"
+REQUEST_TIMEOUT = 60  # 1リクエストのタイムアウト（秒）
+HEALTH_RECHECK_INTERVAL = 10  # 切り離したエンジンを再確認する間隔（秒）
+HEALTH_CHECK_TIMEOUT = 5  # 疎通確認（/version）のタイムアウト（秒）
+TIMEOUT_RETRIES = 1  # タイムアウトしたチャンクを同じエンジンで再実行する回数（別エンジンがない場合）
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    レイテンシを見ながら同時実行数を増減させるリミッター
+
+    1文字あたりの合成時間が最小値（エンジンが空いている時の値）に近いうちは
+    同時実行数を1ずつ増やし、許容倍率を超えて遅くなったら減らす。
+    エラー時は半減させる。スループットが頭打ちになる点付近で並列数が安定する。
+    """
+
+    def __init__(self, initial_limit=1, min_limit=1, max_limit=4, tolerance=1.5, baseline=None):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.tolerance = tolerance
+
+        self.in_flight = 0
+        self.baseline = baseline  # 観測した最小の1文字あたり秒数（事前計測値があれば初期値に使う）
+        self.samples = []
+
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """同時実行数の上限に空きが出るまで待機"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def try_acquire(self):
+        """空きがあれば待たずに1枠確保する（確保できたらTrue）"""
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, seconds_per_char=None, error=False):
+        """実行完了を通知し、計測結果から上限を調整"""
+        with self._cond:
+            self.in_flight -= 1
+
+            if error:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.samples.clear()
+            elif seconds_per_char is not None:
+                if self.baseline is None or seconds_per_char < self.baseline:
+                    self.baseline = seconds_per_char
+                self.samples.append(seconds_per_char)
+
+                # 現在の並列数ぶんのサンプルが溜まったら評価する
+                if len(self.samples) >= int(self.limit):
+                    average = sum(self.samples) / len(self.samples)
+                    self.samples.clear()
+                    if average <= self.baseline * self.tolerance:
+                        self.limit = min(self.max_limit, self.limit + 1)
+                    else:
+                        self.limit = max(self.min_limit, self.limit * 0.75)
+
+            self._cond.notify_all()
+
+    def current_limit(self):
+        return int(self.limit)
+
+
+class VoicevoxClient:
+    """コネクションプールと適応的な並列数制御を持つVOICEVOXクライアント"""
+
+    def __init__(self, base_url=VOICEVOX_URL, max_concurrency=4, initial_concurrency=1,
+                 timeout=REQUEST_TIMEOUT, chars_per_second=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_concurrency, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=initial_concurrency,
+            max_limit=max_concurrency,
+            baseline=1 / chars_per_second if chars_per_second else None,
+        )
+
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.total_latency = 0.0
+        self.total_chars = 0
+        self.peak_concurrency = 0
+
+    def version(self, timeout=None):
+        """エンジンのバージョンを取得"""
+        response = self.session.get(f"{self.base_url}/version", timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def initialize_speaker(self, speaker_id):
+        """話者のモデルを読み込む（読み込み済みの場合は何もしない）"""
+        response = self.session.post(
+            f"{self.base_url}/initialize_speaker",
+            params={"speaker": speaker_id, "skip_reinit": "true"},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+    def user_dict(self):
+        """ユーザー辞書の単語一覧を取得 {uuid: 単語}"""
+        response = self.session.get(f"{self.base_url}/user_dict", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def add_user_dict_word(self, surface, pronunciation, accent_type, word_type='PROPER_NOUN'):
+        """ユーザー辞書に単語を追加し、単語のUUIDを返す"""
+        response = self.session.post(
+            f"{self.base_url}/user_dict_word",
+            params={"surface": surface, "pronunciation": pronunciation,
+                    "accent_type": accent_type, "word_type": word_type},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def update_user_dict_word(self, word_uuid, surface, pronunciation, accent_type, word_type='PROPER_NOUN'):
+        """ユーザー辞書の単語を更新"""
+        response = self.session.put(
+            f"{self.base_url}/user_dict_word/{word_uuid}",
+            params={"surface": surface, "pronunciation": pronunciation,
+                    "accent_type": accent_type, "word_type": word_type},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+    def audio_query(self, text, speaker_id):
+        """音声合成用のクエリを作成"""
+        response = self.session.post(
+            f"{self.base_url}/audio_query",
+            params={"text": text, "speaker": speaker_id},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def synthesis(self, query, speaker_id):
+        """クエリからWAVのバイト列を合成"""
+        response = self.session.post(
+            f"{self.base_url}/synthesis",
+            params={"speaker": speaker_id},
+            json=query,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.content
+
+    def synthesize(self, text, speaker_id, params=None, reserved=False):
+        """
+        テキストを音声合成してWAVのバイト列を返す
+
+        paramsを指定した場合はクエリの値（speedScaleなど）を上書きする。
+        同時実行数の上限に達している場合は空きが出るまで待機する。
+        reservedがTrueの場合は呼び出し側がlimiter.try_acquire()で確保済みの枠を使う
+        （枠は成功・失敗のどちらでもここで解放する）。
+        """
+        if not reserved:
+            self.limiter.acquire()
+        with self._stats_lock:
+            self.peak_concurrency = max(self.peak_concurrency, self.limiter.in_flight)
+
+        started = time.monotonic()
+        try:
+            query = self.audio_query(text, speaker_id)
+            if params:
+                query.update(params)
+            audio = self.synthesis(query, speaker_id)
+        except Exception:
+            self.limiter.release(error=True)
+            with self._stats_lock:
+                self.error_count += 1
+            raise
+
+        elapsed = time.monotonic() - started
+        self.limiter.release(seconds_per_char=elapsed / max(len(text), 1))
+
+        with self._stats_lock:
+            self.request_count += 1
+            self.total_latency += elapsed
+            self.total_chars += len(text)
+
+        return audio
+
+    def stats(self):
+        """計測結果のサマリーを返す"""
+        with self._stats_lock:
+            return {
+                'requests': self.request_count,
+                'errors': self.error_count,
+                'avg_latency': self.total_latency / self.request_count if self.request_count else 0.0,
+                'chars_per_second': self.total_chars / self.total_latency if self.total_latency else 0.0,
+                'concurrency_limit': self.limiter.current_limit(),
+                'peak_concurrency': self.peak_concurrency,
+            }
+
+    def close(self):
+        self.session.close()
+
+
+def sync_user_dictionary(client, words):
+    """
+    読み辞書の単語をユーザー辞書に登録（登録済みで読みが異なる単語は更新）
+
+    Returns:
+        tuple: (追加した単語数, 更新した単語数)
+    """
+    # エンジン側では表記が全角で保存されるため、正規化して比較する
+    existing = {
+        unicodedata.normalize('NFKC', word['surface']).lower(): (word_uuid, word)
+        for word_uuid, word in client.user_dict().items()
+    }
+
+    added = updated = 0
+    for word in words:
+        accent_type = word.get('accent_type', 0)
+        match = existing.get(unicodedata.normalize('NFKC', word['surface']).lower())
+        if match is None:
+            client.add_user_dict_word(word['surface'], word['pronunciation'], accent_type)
+            added += 1
+            continue
+
+        word_uuid, registered = match
+        if (registered.get('pronunciation') != word['pronunciation']
+                or registered.get('accent_type') != accent_type):
+            client.update_user_dict_word(word_uuid, word['surface'], word['pronunciation'], accent_type)
+            updated += 1
+
+    return added, updated
+
+
+class VoicevoxPool:
+    """
+    複数のVOICEVOXエンジンに負荷分散するクライアント
+
+    - 起動時に各エンジンの /version で疎通確認（step3と同じ確認方法）
+    - 合成結果のキャッシュキーにエンジンのバージョンを使うため、バージョンの異なるエンジンは混在させない
+      （起動時に異なれば作成しない、復旧したエンジンのバージョンが変わっていれば使わない）
+    - wordsを指定した場合は、使い始める前（起動時・復旧時）にユーザー辞書を同期し、
+      同期できなかったエンジンは使わない（コンテナを作り直すとユーザー辞書は消えるため）
+    - 同時実行数に空きがあるエンジンのうち、使用率が最も低いものに送る
+    - 接続エラーが起きたエンジンは切り離し、そのチャンクを別エンジンで再実行
+    - タイムアウトはエンジンが動いていても起きる（合成が遅いだけ）ため切り離さず、
+      別エンジンがあればそちらで、なければ同じエンジンで再実行する
+    - 切り離したエンジンは一定時間ごとに再確認し、復旧していれば戻す
+      （すべて切り離された場合は待たずに再確認する）
+    """
+
+    def __init__(self, base_urls, max_concurrency=4, initial_concurrency=1,
+                 timeout=REQUEST_TIMEOUT, recheck_interval=HEALTH_RECHECK_INTERVAL,
+                 chars_per_second=None, words=None):
+        if not base_urls:
+            raise ValueError("VOICEVOXのエンドポイントが指定されていません")
+
+        # chars_per_second: エンジンごとの事前計測値 {url: 文字/秒}
+        chars_per_second = chars_per_second or {}
+        self.clients = [
+            VoicevoxClient(url, max_concurrency=max_concurrency,
+                           initial_concurrency=initial_concurrency, timeout=timeout,
+                           chars_per_second=chars_per_second.get(url))
+            for url in base_urls
+        ]
+        self.max_concurrency = max_concurrency * len(self.clients)
+        self.recheck_interval = recheck_interval
+        self.words = list(words or [])
+
+        self._cond = threading.Condition()
+        self._healthy = {}  # client -> bool
+        self._last_check = {}  # client -> 最終確認時刻
+        self._versions = {}  # client -> 最後に確認したバージョン
+        self.engine_version = None
+        self.reroute_count = 0
+
+        for client in self.clients:
+            self._check(client)
+
+        if not any(self._healthy.values()):
+            raise RuntimeError(f"利用可能なVOICEVOXエンジンがありません: {', '.join(base_urls)}")
+
+        versions = {self._versions[client] for client in self.healthy_clients()}
+        if len(versions) > 1:
+            detail = ', '.join(f"{client.base_url}={self._versions[client]}" for client in self.healthy_clients())
+            raise RuntimeError(f"VOICEVOXエンジンのバージョンが一致しません: {detail}")
+        self.engine_version = versions.pop()
+
+    def _check(self, client):
+        """エンジンの疎通確認（/version）と、使い始めるエンジンのユーザー辞書の同期"""
+        with self._cond:
+            was_healthy = self._healthy.get(client)
+
+        try:
+            version = client.version(timeout=HEALTH_CHECK_TIMEOUT)
+            healthy = True
+        except Exception:
+            version = None
+            healthy = False
+
+        # 作り直されたエンジンのバージョンが変わっていれば、別のバージョンの音声が混ざるため使わない
+        if healthy and self.engine_version is not None and version != self.engine_version:
+            print(f"⚠️  VOICEVOXエンジンのバージョンが異なるため使用しません: {client.base_url} "
+                  f"({version}、ほかのエンジンは {self.engine_version})")
+            healthy = False
+
+        # 起動・復旧したエンジンは再起動でユーザー辞書が消えている可能性があるため同期してから使う
+        if healthy and self.words and not was_healthy:
+            try:
+                added, updated = sync_user_dictionary(client, self.words)
+                if added or updated:
+                    print(f"🔧 ユーザー辞書を同期しました: {client.base_url} (追加 {added} 語 / 更新 {updated} 語)")
+            except Exception as e:
+                print(f"⚠️  ユーザー辞書を同期できないため使用しません: {client.base_url} ({e})")
+                healthy = False
+
+        with self._cond:
+            self._healthy[client] = healthy
+            self._versions[client] = version
+            self._last_check[client] = time.monotonic()
+            self._cond.notify_all()
+
+        if healthy and was_healthy is False:
+            print(f"✓ VOICEVOXエンジンが復旧しました: {client.base_url}")
+        elif not healthy and was_healthy is not False:
+            print(f"⚠️  VOICEVOXエンジンに接続できません: {client.base_url}")
+        return healthy
+
+    def _mark_unhealthy(self, client):
+        with self._cond:
+            if self._healthy.get(client):
+                print(f"⚠️  VOICEVOXエンジンを切り離します: {client.base_url}")
+            self._healthy[client] = False
+            self._last_check[client] = time.monotonic()
+            self._cond.notify_all()
+
+    def _recheck_unhealthy(self, force=False):
+        """切り離し中のエンジンのうち、再確認の時期が来たもの（forceの場合はすべて）を確認"""
+        now = time.monotonic()
+        with self._cond:
+            targets = [
+                client for client in self.clients
+                if not self._healthy[client]
+                and (force or now - self._last_check[client] >= self.recheck_interval)
+            ]
+            for client in targets:
+                self._last_check[client] = now
+        for client in targets:
+            self._check(client)
+
+    def healthy_clients(self):
+        with self._cond:
+            return [client for client in self.clients if self._healthy[client]]
+
+    def _candidates(self, exclude):
+        with self._cond:
+            return [client for client in self.clients if self._healthy[client] and client not in exclude]
+
+    def _select(self, exclude):
+        """
+        空きがあり使用率が最も低い正常なエンジンを選び、同時実行数の枠を確保して返す（空きがなければ待機）
+
+        空きの確認と枠の確保をプールのロック内でまとめて行うため、複数のワーカーが
+        同じエンジンの最後の枠を選んで片方が待たされることはない。
+        """
+        while True:
+            self._recheck_unhealthy()
+            if not self._candidates(exclude):
+                # 正常なエンジンがなくなった場合は再確認の間隔を待たずに確認する
+                self._recheck_unhealthy(force=True)
+            with self._cond:
+                candidates = [
+                    client for client in self.clients
+                    if self._healthy[client] and client not in exclude
+                ]
+                if not candidates:
+                    return None
+
+                available = [
+                    client for client in candidates
+                    if client.limiter.in_flight < client.limiter.current_limit()
+                ]
+                for client in sorted(
+                    available,
+                    key=lambda c: c.limiter.in_flight / max(c.limiter.current_limit(), 1)
+                ):
+                    if client.limiter.try_acquire():
+                        return client
+                self._cond.wait(timeout=1.0)
+
+    def version(self):
+        """エンジンのバージョン（プール内のすべてのエンジンで共通）"""
+        return self.engine_version
+
+    def synthesize(self, text, speaker_id, params=None):
+        """最も空いているエンジンで音声合成（エンジン障害・タイムアウト時は再実行）"""
+        failed = set()  # 接続できなかったエンジン（切り離し済み）
+        timed_out = set()  # タイムアウトしたエンジン（正常なまま）
+        timeouts = 0
+        while True:
+            client = self._select(failed | timed_out)
+            if client is None and timed_out:
+                # 別エンジンがなければタイムアウトしたエンジンで再実行する
+                client = self._select(failed)
+            if client is None:
+                raise RuntimeError("利用可能なVOICEVOXエンジンがありません")
+
+            try:
+                # _selectで確保した枠を使う（client.synthesizeが成功・失敗時に解放する）
+                return client.synthesize(text, speaker_id, params, reserved=True)
+            except requests.ConnectionError:
+                # エンジンが落ちた可能性があるため切り離して別エンジンへ（接続タイムアウトを含む）
+                failed.add(client)
+                self._mark_unhealthy(client)
+                with self._cond:
+                    self.reroute_count += 1
+            except requests.Timeout:
+                timeouts += 1
+                if timeouts > TIMEOUT_RETRIES + len(self.clients) - 1:
+                    raise
+                timed_out.add(client)
+                with self._cond:
+                    self.reroute_count += 1
+            finally:
+                with self._cond:
+                    self._cond.notify_all()
+
+    def stats(self):
+        """全エンジンの計測結果を合算"""
+        per_engine = [(client.base_url, client.stats()) for client in self.clients]
+        requests_total = sum(s['requests'] for _, s in per_engine)
+        latency_total = sum(s['avg_latency'] * s['requests'] for _, s in per_engine)
+        chars_total = sum(client.total_chars for client in self.clients)
+        return {
+            'requests': requests_total,
+            'errors': sum(s['errors'] for _, s in per_engine),
+            'avg_latency': latency_total / requests_total if requests_total else 0.0,
+            'chars_per_second': chars_total / latency_total if latency_total else 0.0,
+            'concurrency_limit': sum(s['concurrency_limit'] for _, s in per_engine),
+            'peak_concurrency': sum(s['peak_concurrency'] for _, s in per_engine),
+            'engines': len(self.clients),
+            'healthy_engines': len(self.healthy_clients()),
+            'reroutes': self.reroute_count,
+            'per_engine': per_engine,
+        }
+
+    def close(self):
+        for client in self.clients:
+            client.close()
@@ -1,5 +1,6 @@
 #!/bin/bash
 # Step 5: S3アップロード
+# step4で音声が確定するたびにアップロード済みのため、ここでは未アップロード・失敗分のみを転送する
 
 set -e
 
@@ -8,29 +9,19 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/../.." && pwd)"
 
 cd "$PROJECT_ROOT"
 
-# .envファイルを読み込む
-if [ -f ".env" ]; then
-    while IFS='=' read -r key value; do
-        # コメント行と空行をスキップ
-        [[ "$key" =~ ^#.*$ ]] && continue
-        [[ -z "$key" ]] && continue
-        # インラインコメントを削除
-        value="${value%%#*}"
-        # 前後の空白を削除
-        value=$(echo "$value" | sed -e 's/^[[:space:]]*//' -e 's/[[:space:]]*$//')
-        # 環境変数としてエクスポート
-        export "$key=$value"
-    done < .env
-fi
-
-# デフォルト値を設定
-S3_BUCKET="${S3_BUCKET_NAME:-rsspeaker-audio-files}"
-S3_REGION="${S3_REGION:-ap-southeast-2}"
-
 echo "=================================="
 echo "Step 5: Uploading to S3..."
 echo "=================================="
 
+# 仮想環境の確認とアクティベート
+if [ ! -d "venv" ]; then
+    echo "✗ 仮想環境が見つかりません"
+    echo "  ./setup.sh を実行してください"
+    exit 1
+fi
+
+source venv/bin/activate
+
 # 最新のoutputディレクトリを探す
 LATEST_OUTPUT=$(ls -td output/*/ 2>/dev/null | head -1)
 if [ -z "$LATEST_OUTPUT" ]; then
@@ -39,48 +30,16 @@ if [ -z "$LATEST_OUTPUT" ]; then
     exit 1
 fi
 
-# 末尾のスラッシュを削除
-OUTPUT_DIR="${LATEST_OUTPUT%/}"
-echo "Output directory: $OUTPUT_DIR"
-
-# タイムスタンプを抽出（output/20251201_161058 → 20251201_161058）
-TIMESTAMP=$(basename "$OUTPUT_DIR")
-
-# AWS CLIの検索
-AWS_CLI=""
-for path in /usr/local/bin/aws /usr/bin/aws $(which aws 2>/dev/null); do
-    if [ -f "$path" ] && [ -x "$path" ]; then
-        AWS_CLI="$path"
-        break
-    fi
-done
-
-if [ -z "$AWS_CLI" ]; then
-    echo "✗ AWS CLI not found"
-    exit 1
-fi
-
-echo "Using AWS CLI: $AWS_CLI"
-
-# 音声ファイル数を確認
-FILE_COUNT=$(find "$OUTPUT_DIR" -name "*.wav" | wc -l)
-echo "Found $FILE_COUNT audio files"
-
-if [ $FILE_COUNT -eq 0 ]; then
-    echo "✗ No audio files found"
-    exit 1
-fi
+# 共有のboto3セッションで並列アップロード（チェックサムで照合、同じ内容のファイルはスキップ）
+UPLOAD_EXIT_CODE=0
+python3 -u pipeline/step5_s3/upload_to_s3.py "${LATEST_OUTPUT%/}" || UPLOAD_EXIT_CODE=$?
 
-# S3にアップロード
-echo "Uploading to S3..."
-$AWS_CLI s3 sync "$OUTPUT_DIR" "s3://${S3_BUCKET}/${TIMESTAMP}/"
-S3_EXIT_CODE=$?
+deactivate
 
-if [ $S3_EXIT_CODE -eq 0 ]; then
+if [ $UPLOAD_EXIT_CODE -eq 0 ]; then
     echo "✓ S3 upload completed"
-    echo "S3 URL: https://${S3_BUCKET}.s3.${S3_REGION}.amazonaws.com/${TIMESTAMP}/"
 else
-    echo "✗ S3 upload failed (exit code: $S3_EXIT_CODE)"
+    echo "✗ S3 upload failed (exit code: $UPLOAD_EXIT_CODE)"
     exit 1
 fi
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+出力ディレクトリの音声ファイルをS3にアップロード
+step4でアップロード済みの（同じ内容の）ファイルはスキップし、未アップロード・失敗分のみを転送する
+"""
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# プロジェクトルートの.envファイルを読み込む
+project_root = Path(__file__).parent.parent.parent
+load_dotenv(project_root / '.env')
+
+sys.path.insert(0, str(project_root / 'pipeline' / 'common'))
+sys.path.insert(0, str(project_root / 'pipeline' / 'step4_audio'))
+from audio_encoder import AUDIO_FORMATS
+from s3_publisher import S3Uploader, public_url
+
+AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'mp3')
+
+
+def audio_extension(audio_format=AUDIO_FORMAT):
+    """公開する音声ファイルの拡張子（step4のAUDIO_FORMATに対応）"""
+    audio_format = audio_format.lower()
+    if audio_format == 'wav':
+        return '.wav'
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"未対応のAUDIO_FORMATです: {audio_format}")
+    return AUDIO_FORMATS[audio_format]['ext']
+
+
+def upload_output_dir(output_dir):
+    """
+    出力ディレクトリの音声ファイルを s3://<バケット>/<ディレクトリ名>/ にアップロード
+
+    Returns:
+        list: 各ファイルの結果（失敗したものは error を含む）
+    """
+    extension = audio_extension()
+    audio_files = sorted(
+        os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.endswith(extension)
+    )
+    print(f"✓ {len(audio_files)} 件の音声ファイル（*{extension}）を検出")
+    if not audio_files:
+        raise FileNotFoundError(f"音声ファイルが見つかりません: {output_dir}")
+
+    uploader = S3Uploader(os.path.basename(os.path.normpath(output_dir)))
+    for path in audio_files:
+        uploader.submit(path)
+    results = uploader.wait()
+
+    uploaded = sum(1 for r in results if r['success'] and not r['skipped'])
+    skipped = sum(1 for r in results if r['success'] and r['skipped'])
+    print(f"✓ アップロード {uploaded} 件 / アップロード済み {skipped} 件")
+    print(f"S3 URL: {public_url(uploader.prefix + '/')}")
+    return results
+
+
+def main(output_dir):
+    print(f"Output directory: {output_dir}")
+    results = upload_output_dir(output_dir)
+
+    failed = [r for r in results if not r['success']]
+    for result in failed:
+        print(f"✗ {result['key']} - {result['error']}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("使用法: python3 upload_to_s3.py <output_dir>")
+        sys.exit(1)
+    main(sys.argv[1])
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+公開済みエピソードのインデックス（S3上のJSONオブジェクト）
+- 公開のたびに今回の回の音声のうち、S3へのアップロードを確認できたものを追記する
+- RSS生成はこのオブジェクト1つを読むだけで済み、バケット全体を一覧しない
+- インデックスがない・作り直す場合のみ、バケット全体をページングして一覧し再構築する
+- 前回の公開時のフィードのページ分け設定も記録し、設定が変わった場合はアーカイブ全体を作り直せるようにする
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+from audio_manifest import AudioManifest
+from s3_publisher import CONTENT_TYPES, S3_BUCKET, public_url
+
+EPISODE_INDEX_KEY = os.getenv('EPISODE_INDEX_KEY', 'episodes.json')
+INDEX_VERSION = 1
+
+
+def to_record(episode):
+    """エピソードをインデックスに保存する形式に変換"""
+    return dict(episode, pub_date=episode['pub_date'].astimezone(timezone.utc).isoformat())
+
+
+def from_record(record):
+    """インデックスの1件をエピソードに変換（pub_dateをdatetimeに戻す）"""
+    return dict(record, pub_date=datetime.fromisoformat(record['pub_date']))
+
+
+def load_episode_index(client, bucket=S3_BUCKET, key=EPISODE_INDEX_KEY):
+    """
+    インデックスを読み込む（存在しなければNone）
+
+    Returns:
+        tuple: (エピソードのリスト, 前回公開したフィードのページ分け設定（記録がなければNone）)
+    """
+    try:
+        response = client.get_object(Bucket=bucket, Key=key)
+    except client.exceptions.NoSuchKey:
+        return None
+    data = json.loads(response['Body'].read())
+    return [from_record(record) for record in data.get('episodes', [])], data.get('feed')
+
+
+def save_episode_index(client, episodes, feed_layout=None, bucket=S3_BUCKET, key=EPISODE_INDEX_KEY):
+    """
+    インデックスを書き込む（新しい順に並べて保存）
+
+    feed_layoutには今回公開したフィードのページ分け設定（max_items・page_size）を渡す。
+    """
+    episodes = sorted(episodes, key=lambda e: e['pub_date'], reverse=True)
+    body = json.dumps({
+        'version': INDEX_VERSION,
+        'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'feed': feed_layout,
+        'episodes': [to_record(episode) for episode in episodes],
+    }, ensure_ascii=False, separators=(',', ':'))
+    client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body.encode('utf-8'),
+        ContentType='application/json; charset=utf-8',
+    )
+    return episodes
+
+
+def episodes_from_manifest(output_dir, keys=None):
+    """
+    今回の出力ディレクトリのマニフェストからエピソードを作成
+
+    keysを指定した場合は、そのオブジェクトキー（アップロードを確認できたもの）のエピソードだけを作成する。
+    """
+    folder = os.path.basename(os.path.normpath(output_dir))
+    episodes = []
+    for entry in AudioManifest(output_dir).entries.values():
+        key = f"{folder}/{entry['audio_file']}"
+        if keys is not None and key not in keys:
+            continue
+        extension = os.path.splitext(entry['audio_file'])[1].lower()
+        episodes.append({
+            'key': key,
+            'title': entry['title'],
+            'url': public_url(key),
+            'size': entry['bytes'],
+            'duration': entry.get('duration'),
+            # completed_atはローカル時刻で記録されている
+            'pub_date': datetime.fromisoformat(entry['completed_at']).astimezone(timezone.utc),
+            'mime_type': CONTENT_TYPES.get(extension, 'application/octet-stream'),
+            'folder': folder,
+        })
+    return episodes
+
+
+def merge_episodes(episodes, new_episodes):
+    """インデックスに今回のエピソードを追加（同じオブジェクトは新しい記録で置き換える）"""
+    merged = {episode['key']: episode for episode in episodes}
+    for episode in new_episodes:
+        merged[episode['key']] = episode
+    return list(merged.values())
+
+
+def rebuild_episode_index(client, bucket=S3_BUCKET):
+    """
+    バケット全体を一覧してエピソードを作り直す（インデックスがない場合・明示的な再構築用）
+
+    list_objects_v2をページングして1000件を超えるオブジェクトもすべて対象にする。
+    再生時間は分からないため記録しない。
+    """
+    episodes = []
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket):
+        for obj in page.get('Contents', []):
+            folder, _, filename = obj['Key'].rpartition('/')
+            stem, extension = os.path.splitext(filename)
+            if not folder or extension not in CONTENT_TYPES:
+                continue
+
+            episodes.append({
+                'key': obj['Key'],
+                # ファイル名から記事タイトルを復元
+                'title': stem.replace('_', ' '),
+                'url': public_url(obj['Key'], bucket),
+                'size': obj['Size'],
+                'duration': None,
+                'pub_date': obj['LastModified'],
+                'mime_type': CONTENT_TYPES[extension],
+                'folder': folder,
+            })
+    return episodes
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 """
-S3上の音声ファイルからPodcast RSSフィードを生成
+S3上のエピソードインデックスからPodcast RSSフィードを生成
 """
+import gzip
 import json
 import os
-from datetime import datetime
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
-import boto3
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -15,130 +14,324 @@ from dotenv import load_dotenv
 project_root = Path(__file__).parent.parent.parent
 load_dotenv(project_root / '.env')
 
+sys.path.insert(0, str(project_root / 'pipeline' / 'common'))
+sys.path.insert(0, str(project_root / 'pipeline' / 'step4_audio'))
+from audio_manifest import AudioManifest
+from s3_publisher import S3_BUCKET, S3_REGION, S3Uploader, get_s3_client, public_url, put_if_changed
+from episode_index import (
+    episodes_from_manifest,
+    load_episode_index,
+    merge_episodes,
+    rebuild_episode_index,
+    save_episode_index,
+)
+from rss_writer import render
+from story_history import StoryHistory
+
 # 環境変数から設定を読み込む（デフォルト値を設定）
-S3_BUCKET = os.getenv("S3_BUCKET_NAME", "rsspeaker-audio-files")
-S3_REGION = os.getenv("S3_REGION", "ap-southeast-2")
 PODCAST_TITLE = os.getenv("PODCAST_TITLE", "RSSpeaker Tech News")
 PODCAST_DESCRIPTION = os.getenv("PODCAST_DESCRIPTION", "AI技術ニュースを音声でお届けします")
 PODCAST_AUTHOR = os.getenv("PODCAST_AUTHOR", "RSSpeaker")
 PODCAST_EMAIL = os.getenv("PODCAST_EMAIL", "podcast@example.com")
 PODCAST_IMAGE_URL = os.getenv("PODCAST_IMAGE_URL", "https://www.kcsf.co.jp/wp-content/uploads/2020/03/ai.jpg")
+DEFAULT_DURATION_SECONDS = 600  # 再生時間が分からないエピソード（再構築したもの）のitunes:duration
+RSS_FEED_KEY = 'podcast.rss'
+RSS_MAX_ITEMS = int(os.getenv("RSS_MAX_ITEMS", "100"))  # メインフィードに載せるエピソード数の上限
+RSS_ARCHIVE_PAGE_SIZE = int(os.getenv("RSS_ARCHIVE_PAGE_SIZE", "100"))  # アーカイブ1ページあたりのエピソード数
+ARCHIVE_KEY_TEMPLATE = 'podcast-archive-{page}.rss'
+RSS_CONTENT_TYPE = 'application/rss+xml; charset=utf-8'
+RSS_CACHE_MAX_AGE = int(os.getenv("RSS_CACHE_MAX_AGE", "300"))  # podcast.rssをクライアント・CDNがキャッシュする秒数
+ARCHIVE_CACHE_MAX_AGE = 86400  # 一杯になったアーカイブページのキャッシュ秒数（以降は内容が変わらない）
+RSS_GZIP = os.getenv("RSS_GZIP", "0") == "1"  # gzip圧縮版（<キー>.gz、Content-Encoding: gzip）も保存する
+
+def paginate_episodes(episodes, max_items=RSS_MAX_ITEMS, page_size=RSS_ARCHIVE_PAGE_SIZE):
+    """
+    エピソード（新しい順）をメインフィード分とアーカイブページに分ける
+
+    アーカイブは古いエピソードから順にページ番号1から詰めるため、
+    一杯になったページは以降の公開で内容が変わらない。
+
+    Returns:
+        tuple: (メインフィードのエピソード, ページごとのエピソードのリスト（古いページから、各ページ内は新しい順）)
+    """
+    current = episodes[:max_items]
+    older = episodes[max_items:][::-1]
+    pages = [older[i:i + page_size][::-1] for i in range(0, len(older), page_size)]
+    return current, pages
+
+def archive_key(page):
+    return ARCHIVE_KEY_TEMPLATE.format(page=page)
+
+def feed_layout(max_items=RSS_MAX_ITEMS, page_size=RSS_ARCHIVE_PAGE_SIZE):
+    """エピソードインデックスに記録するフィードのページ分け設定"""
+    return {'max_items': max_items, 'page_size': page_size}
+
+def first_changed_page(episodes, previous_episodes, changed_keys, max_items=RSS_MAX_ITEMS,
+                       page_size=RSS_ARCHIVE_PAGE_SIZE):
+    """
+    今回内容が変わりうる最初のアーカイブページ番号を求める
+
+    前回の時点で一杯だったページは変わらないため、前回の最後の途中のページ
+    （前回ちょうど一杯だった場合はその次のページ）以降だけを生成すればよい。
+    ただし今回追加・更新したエピソード（changed_keys）の前回・今回の位置がアーカイブ側の場合
+    （古い回を公開し直した場合など）は、その位置のページ以降を生成する。
+    前回のエピソードが分からない場合（インデックスを再構築した場合・ページ分けの設定が変わった場合）は1ページ目から。
+
+    Args:
+        episodes: 今回の全エピソード（新しい順）
+        previous_episodes: 前回公開した時点の全エピソード（新しい順）
+        changed_keys: 今回追加・更新したエピソードのキー
+    """
+    if previous_episodes is None:
+        return 1
+    # アーカイブのエピソードを古い順に並べたときの、変わりうる最初の位置
+    first = max(0, len(previous_episodes) - max_items)
+    for listed in (previous_episodes, episodes):
+        for position, episode in enumerate(listed[max_items:], max_items):
+            if episode['key'] in changed_keys:
+                first = min(first, len(listed) - 1 - position)
+    return first // page_size + 1
+
+def generate_rss_feed(episodes, key=RSS_FEED_KEY, links=None, archive=False):
+    """
+    Podcast RSSフィードを生成（要素を順に書き出し、UTF-8のバイト列で返す）
+
+    Args:
+        episodes: フィードに載せるエピソード（新しい順）
+        key: フィードのオブジェクトキー（atom:link rel="self" に使用）
+        links: ほかのページへのリンク {rel: オブジェクトキー}（RFC 5005のcurrent / prev-archive / next-archive）
+        archive: 一杯になったアーカイブページの場合はTrue（内容が確定したページとして fh:archive を付ける）
+    """
+    build_date = max((e['pub_date'] for e in episodes), default=datetime.now(timezone.utc))
+
+    def write(w):
+        w.start('rss', {
+            'version': '2.0',
+            'xmlns:itunes': 'http://www.itunes.com/dtds/podcast-1.0.dtd',
+            'xmlns:content': 'http://purl.org/rss/1.0/modules/content/',
+            'xmlns:atom': 'http://www.w3.org/2005/Atom',
+            'xmlns:fh': 'http://purl.org/syndication/history/1.0',
+        })
+        w.start('channel')
+
+        # Podcastメタデータ
+        w.element('title', PODCAST_TITLE)
+        w.element('description', PODCAST_DESCRIPTION)
+        w.element('link', f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")
+        w.element('language', 'ja')
+        w.element('copyright', f"© {datetime.now().year} {PODCAST_AUTHOR}")
+        # エピソードが変わらなければ同じ内容になるよう、最新エピソードの公開日時を使う
+        w.element('lastBuildDate', build_date.strftime('%a, %d %b %Y %H:%M:%S GMT'))
+
+        # ページ間のリンク
+        w.element('atom:link', attrs={'rel': 'self', 'href': public_url(key),
+                                      'type': 'application/rss+xml'})
+        for rel, link_key in (links or {}).items():
+            w.element('atom:link', attrs={'rel': rel, 'href': public_url(link_key),
+                                          'type': 'application/rss+xml'})
+        if archive:
+            w.element('fh:archive')
+
+        # iTunes固有のタグ
+        w.element('itunes:author', PODCAST_AUTHOR)
+        w.element('itunes:summary', PODCAST_DESCRIPTION)
+        w.start('itunes:owner')
+        w.element('itunes:name', PODCAST_AUTHOR)
+        w.element('itunes:email', PODCAST_EMAIL)
+        w.end()
+
+        w.element('itunes:image', attrs={'href': PODCAST_IMAGE_URL})
+        w.element('itunes:explicit', 'false')
+        w.element('itunes:category', attrs={'text': 'Technology'})
+
+        # エピソードを追加
+        for episode in episodes:
+            w.start('item')
+            w.element('title', episode['title'])
+            w.element('description', f"{episode['folder']}のニュース")
+            w.element('pubDate', episode['pub_date'].strftime('%a, %d %b %Y %H:%M:%S GMT'))
+            w.element('guid', episode['url'])
+            w.element('enclosure', attrs={
+                'url': episode['url'],
+                'length': episode['size'],
+                'type': episode['mime_type'],
+            })
+            w.element('itunes:duration', round(episode.get('duration') or DEFAULT_DURATION_SECONDS))
+            w.element('itunes:explicit', 'false')
+            w.end()
+
+        w.end()
+        w.end()
+
+    return render(write)
+
+def generate_feeds(episodes, max_items=RSS_MAX_ITEMS, page_size=RSS_ARCHIVE_PAGE_SIZE, first_page=1):
+    """
+    メインフィードと、first_page以降のアーカイブページを生成
+
+    一杯になったページは内容が変わらないため、first_pageより前のページは生成しない。
+    ページを変えないよう、アーカイブページには後から作られるページへのnext-archiveリンクを付けない。
+    途中のページは一杯になるまでfh:archiveを付けず、メインフィードと同じ短いキャッシュにする。
+
+    Returns:
+        list: (オブジェクトキー, フィードのバイト列, キャッシュ秒数) のリスト（先頭がメインフィード）
+    """
+    current, pages = paginate_episodes(episodes, max_items, page_size)
+
+    main_links = {'prev-archive': archive_key(len(pages))} if pages else {}
+    feeds = [(RSS_FEED_KEY, generate_rss_feed(current, links=main_links), RSS_CACHE_MAX_AGE)]
+
+    for page in range(first_page, len(pages) + 1):
+        page_episodes = pages[page - 1]
+        links = {'current': RSS_FEED_KEY}
+        if page > 1:
+            links['prev-archive'] = archive_key(page - 1)
+        full = len(page_episodes) >= page_size
+        feeds.append((archive_key(page),
+                      generate_rss_feed(page_episodes, archive_key(page), links, archive=full),
+                      ARCHIVE_CACHE_MAX_AGE if full else RSS_CACHE_MAX_AGE))
+
+    return feeds
+
+def publish_feeds(s3, feeds):
+    """
+    フィードを内容が変わったものだけアップロード
+
+    フィードごとのキャッシュ秒数でCache-Controlを付ける。
+    RSS_GZIPが有効な場合はgzip圧縮版も同じ条件で保存する（mtimeを固定して内容を決定的にする）。
+
+    Returns:
+        tuple: (アップロードした数, 変更がなくスキップした数)
+    """
+    uploaded = skipped = 0
+    for key, body, max_age in feeds:
+        cache_control = f"public, max-age={max_age}"
+
+        variants = [(key, body, None)]
+        if RSS_GZIP:
+            variants.append((f"{key}.gz", gzip.compress(body, mtime=0), 'gzip'))
+
+        for variant_key, variant_body, encoding in variants:
+            if put_if_changed(s3, variant_key, variant_body, RSS_CONTENT_TYPE,
+                              cache_control=cache_control, content_encoding=encoding):
+                uploaded += 1
+            else:
+                skipped += 1
+    return uploaded, skipped
+
+def confirm_uploaded_keys(s3, output_dir):
+    """
+    マニフェストに記録された音声のうち、同じ内容のオブジェクトがS3にあるもののキーを返す
+
+    step5のアップロード結果がない場合（step6だけを実行した場合）に使う。
+    """
+    folder = os.path.basename(os.path.normpath(output_dir))
+    uploader = S3Uploader(folder, client=s3)
+    keys = set()
+    for entry in AudioManifest(output_dir).entries.values():
+        path = os.path.join(output_dir, entry['audio_file'])
+        if os.path.exists(path) and uploader.is_uploaded(path):
+            keys.add(uploader.key_for(path))
+        else:
+            print(f"⚠️  S3にアップロードされていないため公開しません: {folder}/{entry['audio_file']}")
+    uploader.wait()
+    return keys
+
+def record_published_stories(output_dir, summarized_json, uploaded_keys):
+    """
+    公開した回のニュースを配信履歴に記録（step1で次回以降の候補から除外される）
+
+    音声をS3にアップロードできた（エピソードとして公開した）記事のみを対象にする。
+    """
+    folder = os.path.basename(os.path.normpath(output_dir))
+    manifest = AudioManifest(output_dir)
+    published_titles = {
+        entry['title'] for entry in manifest.entries.values()
+        if f"{folder}/{entry['audio_file']}" in uploaded_keys
+    }
+
+    with open(summarized_json, 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+
+    episode = os.path.basename(os.path.normpath(output_dir))
+    with StoryHistory() as history:
+        added = sum(
+            1 for article in articles
+            if article['title'] in published_titles
+            and history.record(article.get('source', ''), article['title'], episode)
+        )
+        print(f"✓ 配信履歴に {added} 件を記録しました（履歴 {history.count()} 件）")
+
+def update_episode_index(s3, output_dir=None, rebuild=False, uploaded_keys=None):
+    """
+    エピソードインデックスを読み込んで今回の回を追加する（保存はフィードの公開後）
+
+    今回の回のエピソードは、uploaded_keys（アップロードを確認できたオブジェクトキー）に含まれる音声だけを追加する。
+
+    インデックスがない場合とrebuildを指定した場合のみ、バケット全体から作り直す。
+
+    Returns:
+        tuple: (全エピソード（新しい順）,
+                前回公開した時点の全エピソード（新しい順、再構築した場合・ページ分けの設定が変わった場合はNone）,
+                今回追加・更新したエピソードのキー)
+    """
+    loaded = None if rebuild else load_episode_index(s3)
+    previous_episodes = None
+    if loaded is None:
+        print("🔄 バケット全体からエピソードインデックスを再構築中...")
+        episodes = rebuild_episode_index(s3)
+    else:
+        episodes, layout = loaded
+        print(f"✓ エピソードインデックスを読み込みました（{len(episodes)} 件）")
+        if layout == feed_layout():
+            previous_episodes = sorted(episodes, key=lambda e: e['pub_date'], reverse=True)
+        else:
+            print("🔄 フィードのページ分けの設定が前回と異なるため、アーカイブを全ページ作り直します")
+
+    changed_keys = set()
+    if output_dir:
+        new_episodes = episodes_from_manifest(output_dir, uploaded_keys)
+        episodes = merge_episodes(episodes, new_episodes)
+        changed_keys = {episode['key'] for episode in new_episodes}
+        print(f"✓ 今回のエピソード {len(new_episodes)} 件を追加")
+
+    return sorted(episodes, key=lambda e: e['pub_date'], reverse=True), previous_episodes, changed_keys
+
+def main(output_dir=None, summarized_json=None, rebuild=False, uploaded_keys=None):
+    """
+    uploaded_keysにはstep5でアップロードした（またはアップロード済みだった）オブジェクトキーを渡す。
+    省略した場合は今回の回の音声がS3にあるかをHEADで確認する。
+    """
+    print("🎙️  Podcast RSSフィード生成中...")
 
-def get_audio_files_from_s3():
-    """S3から音声ファイルのリストを取得"""
-    s3 = boto3.client('s3', region_name=S3_REGION)
-
-    episodes = []
-
-    # S3バケット内のフォルダをリスト
-    response = s3.list_objects_v2(Bucket=S3_BUCKET, Delimiter='/')
-
-    if 'CommonPrefixes' not in response:
-        return episodes
-
-    for prefix in response['CommonPrefixes']:
-        folder_name = prefix['Prefix'].rstrip('/')
-
-        # フォルダ内の音声ファイルをリスト
-        objects = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix['Prefix'])
-
-        if 'Contents' not in objects:
-            continue
-
-        for obj in objects['Contents']:
-            if obj['Key'].endswith('.wav'):
-                file_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{obj['Key']}"
-
-                # ファイル名から記事タイトルを抽出
-                filename = os.path.basename(obj['Key'])
-                title = filename.replace('.wav', '').replace('_', ' ')
-
-                episodes.append({
-                    'title': title,
-                    'url': file_url,
-                    'pub_date': obj['LastModified'],
-                    'size': obj['Size'],
-                    'folder': folder_name
-                })
-
-    # 日付順にソート（新しい順）
-    episodes.sort(key=lambda x: x['pub_date'], reverse=True)
-
-    return episodes
-
-def generate_rss_feed(episodes):
-    """Podcast RSSフィードを生成"""
-    rss = Element('rss', version='2.0')
-    rss.set('xmlns:itunes', 'http://www.itunes.com/dtds/podcast-1.0.dtd')
-    rss.set('xmlns:content', 'http://purl.org/rss/1.0/modules/content/')
-
-    channel = SubElement(rss, 'channel')
-
-    # Podcastメタデータ
-    SubElement(channel, 'title').text = PODCAST_TITLE
-    SubElement(channel, 'description').text = PODCAST_DESCRIPTION
-    SubElement(channel, 'link').text = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/"
-    SubElement(channel, 'language').text = 'ja'
-    SubElement(channel, 'copyright').text = f"© {datetime.now().year} {PODCAST_AUTHOR}"
-    SubElement(channel, 'lastBuildDate').text = datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')
-
-    # iTunes固有のタグ
-    SubElement(channel, 'itunes:author').text = PODCAST_AUTHOR
-    SubElement(channel, 'itunes:summary').text = PODCAST_DESCRIPTION
-    owner = SubElement(channel, 'itunes:owner')
-    SubElement(owner, 'itunes:name').text = PODCAST_AUTHOR
-    SubElement(owner, 'itunes:email').text = PODCAST_EMAIL
-
-    SubElement(channel, 'itunes:image', href=PODCAST_IMAGE_URL)
-    SubElement(channel, 'itunes:explicit').text = 'false'
-    SubElement(channel, 'itunes:category', text='Technology')
-
-    # エピソードを追加
-    for episode in episodes:
-        item = SubElement(channel, 'item')
-        SubElement(item, 'title').text = episode['title']
-        SubElement(item, 'description').text = f"{episode['folder']}のニュース"
-        SubElement(item, 'pubDate').text = episode['pub_date'].strftime('%a, %d %b %Y %H:%M:%S GMT')
-        SubElement(item, 'guid').text = episode['url']
-
-        SubElement(item, 'enclosure',
-                   url=episode['url'],
-                   length=str(episode['size']),
-                   type='audio/wav')
-
-        SubElement(item, 'itunes:duration').text = '600'
-        SubElement(item, 'itunes:explicit').text = 'false'
-
-    # XMLを整形（XML宣言を含める）
-    rough_string = tostring(rss, encoding='utf-8')
-    reparsed = minidom.parseString(rough_string)
-
-    # XML宣言付きで出力
-    xml_str = reparsed.toprettyxml(indent='  ', encoding='utf-8').decode('utf-8')
+    s3 = get_s3_client()
+    if output_dir and uploaded_keys is None:
+        uploaded_keys = confirm_uploaded_keys(s3, output_dir)
 
-    return xml_str
+    # インデックスのオブジェクト1つからエピソードを取得（今回の回のうちアップロードを確認できたものを追記）
+    episodes, previous_episodes, changed_keys = update_episode_index(s3, output_dir, rebuild, uploaded_keys)
+    print(f"✓ {len(episodes)} エピソード")
 
-def main():
-    print("🎙️  Podcast RSSフィード生成中...")
+    # RSSフィード（最新RSS_MAX_ITEMS件）と、前回から内容が変わりうるアーカイブページだけを生成
+    first_page = first_changed_page(episodes, previous_episodes, changed_keys)
+    feeds = generate_feeds(episodes, first_page=first_page)
 
-    # S3から音声ファイルを取得
-    episodes = get_audio_files_from_s3()
-    print(f"✓ {len(episodes)} エピソードを検出")
+    # S3にアップロード（内容が変わったフィードのみ）
+    uploaded, skipped = publish_feeds(s3, feeds)
 
-    # RSSフィードを生成
-    rss_feed = generate_rss_feed(episodes)
+    # フィードを公開してからインデックスを保存する（公開に失敗した場合は次回そのページから作り直す）
+    save_episode_index(s3, episodes, feed_layout())
 
-    # S3にアップロード
-    s3 = boto3.client('s3', region_name=S3_REGION)
-    s3.put_object(
-        Bucket=S3_BUCKET,
-        Key='podcast.rss',
-        Body=rss_feed.encode('utf-8'),
-        ContentType='application/rss+xml; charset=utf-8'  # charset指定を追加
-    )
+    rss_url = public_url(RSS_FEED_KEY)
+    archived = max(0, len(episodes) - RSS_MAX_ITEMS)
+    page_count = -(-archived // RSS_ARCHIVE_PAGE_SIZE)
+    print(f"✓ RSSフィードを生成しました（メイン {min(len(episodes), RSS_MAX_ITEMS)} 件 / "
+          f"アーカイブ {page_count} ページ中 {len(feeds) - 1} ページを更新）")
+    print(f"✓ アップロード {uploaded} 件 / 変更なしでスキップ {skipped} 件")
 
-    rss_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/podcast.rss"
-    print(f"✓ RSSフィードを生成しました")
+    # 公開できた回のニュースを配信履歴に追加
+    if output_dir and summarized_json and os.path.exists(summarized_json):
+        record_published_stories(output_dir, summarized_json, uploaded_keys)
     print(f"📡 RSS URL: {rss_url}")
     print("\nApple Podcastsに追加:")
     print(f"1. Apple Podcastsアプリを開く")
@@ -147,5 +340,8 @@ def main():
     print(f"   {rss_url}")
 
 if __name__ == "__main__":
-    main()
+    # 引数に今回の出力ディレクトリとsummarized.jsonを渡すとインデックスと配信履歴に記録する
+    # --rebuild を指定するとバケット全体からエピソードインデックスを作り直す
+    args = [arg for arg in sys.argv[1:] if arg != '--rebuild']
+    main(*args[:2], rebuild='--rebuild' in sys.argv[1:])
 
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+ストリーミングXMLライター（RSSフィード用）
+- 要素を書き込み先へ順に出力し、ドキュメント全体のツリーをメモリに持たない
+- 出力はインデント付き（minidomでの再パース・整形は不要）
+"""
+import io
+from xml.sax.saxutils import escape, quoteattr
+
+INDENT = '  '
+
+
+class RSSWriter:
+    """開始タグ・要素・終了タグを順に書き込むXMLライター"""
+
+    def __init__(self, out):
+        self.out = out
+        self.stack = []
+
+    def _line(self, text):
+        self.out.write(INDENT * len(self.stack) + text + '\n')
+
+    @staticmethod
+    def _attributes(attrs):
+        return ''.join(f" {name}={quoteattr(str(value))}" for name, value in (attrs or {}).items())
+
+    def declaration(self):
+        self.out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+
+    def start(self, tag, attrs=None):
+        self._line(f"<{tag}{self._attributes(attrs)}>")
+        self.stack.append(tag)
+
+    def end(self):
+        tag = self.stack.pop()
+        self._line(f"</{tag}>")
+
+    def element(self, tag, text=None, attrs=None):
+        """テキストだけを持つ要素（textがNoneの場合は空要素）"""
+        if text is None:
+            self._line(f"<{tag}{self._attributes(attrs)}/>")
+        else:
+            self._line(f"<{tag}{self._attributes(attrs)}>{escape(str(text))}</{tag}>")
+
+
+def render(write_document):
+    """write_document(writer) で書き込んだドキュメントをUTF-8のバイト列で返す"""
+    buffer = io.BytesIO()
+    out = io.TextIOWrapper(buffer, encoding='utf-8', newline='\n')
+    writer = RSSWriter(out)
+    writer.declaration()
+    write_document(writer)
+    out.flush()
+    data = buffer.getvalue()
+    out.detach()
+    return data
@@ -21,8 +21,16 @@ fi
 
 source venv/bin/activate
 
-# Podcast RSSフィード生成
-python3 pipeline/step6_rss/generate_podcast_rss.py
+# 今回公開した回（最新のoutputディレクトリと対応するsummarized.json）
+LATEST_OUTPUT=$(ls -td output/*/ 2>/dev/null | head -1)
+PUBLISH_ARGS=()
+if [ -n "$LATEST_OUTPUT" ]; then
+    TIMESTAMP=$(basename "$LATEST_OUTPUT")
+    PUBLISH_ARGS=("${LATEST_OUTPUT%/}" "data/${TIMESTAMP}/summarized.json")
+fi
+
+# Podcast RSSフィード生成（公開したニュースを配信履歴に記録）
+python3 pipeline/step6_rss/generate_podcast_rss.py "${PUBLISH_ARGS[@]}"
 
 echo "✓ Podcast RSS feed generated"
 
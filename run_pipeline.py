@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+RSSpeaker パイプライン実行（1プロセスで全ステップを実行）
+- ステップを依存関係のDAGとして実行し、依存のないステップは並行に実行する
+  （VOICEVOXの起動・ウォームアップはstep1・step2と並行）
+- ステップ間のデータ（ニュース概要・ナレーション原稿）はメモリで受け渡し、ファイルは記録用に書き出す
+- 実行ディレクトリ（data/<run_id>、output/<run_id>）は最初に決めて全ステップに渡す
+- --stage で1つのステップだけを実行できる（入力は --run-id の実行ディレクトリから読む）
+"""
+import argparse
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+# 各ステップのモジュールが設定を読む前に.envを読み込む
+project_root = Path(__file__).parent
+load_dotenv(project_root / '.env')
+
+for step_dir in ['common', 'step1_fetch', 'step2_summarize', 'step3_voicevox', 'step4_audio',
+                 'step5_s3', 'step6_rss']:
+    sys.path.insert(0, str(project_root / 'pipeline' / step_dir))
+
+
+class PipelineError(Exception):
+    """パイプラインのステップが失敗した"""
+
+
+class PipelineRun:
+    """1回の実行のディレクトリとステップ間で受け渡すデータ"""
+
+    def __init__(self, run_id, stream=False):
+        self.run_id = run_id
+        self.stream = stream
+        self.data_dir = project_root / 'data' / run_id
+        self.output_dir = project_root / 'output' / run_id
+        self.topics_file = self.data_dir / 'topics.json'
+        self.summarized_json = self.data_dir / 'summarized.json'
+        self.topics = None
+        self.narrations = None
+        self.uploaded_keys = None  # step5でアップロードを確認できたオブジェクトキー
+
+    def _load(self, path):
+        if not path.exists():
+            raise PipelineError(f"{path} が見つかりません（先に前のステップを実行してください）")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_topics(self):
+        """ニュース概要（同じプロセスで生成していなければtopics.jsonから読む）"""
+        if self.topics is None:
+            self.topics = self._load(self.topics_file)
+        return self.topics
+
+    def load_narrations(self):
+        """ナレーション原稿（同じプロセスで生成していなければsummarized.jsonから読む）"""
+        if self.narrations is None:
+            self.narrations = self._load(self.summarized_json)
+        return self.narrations
+
+
+def run_fetch(run):
+    from gemini_client import GEMINI_USAGE_FILE, get_gemini_client
+    from generate_news_topics_search import generate_news_topics, save_news_topics
+
+    run.topics = generate_news_topics()
+    save_news_topics(run.topics, str(run.data_dir.parent), timestamp=run.run_id)
+    get_gemini_client().save_usage(run.data_dir / GEMINI_USAGE_FILE)
+    if not run.topics:
+        raise PipelineError("ニュースが見つかりませんでした")
+
+
+def run_voicevox(run):
+    from engine_launcher import ensure_engines
+    from preflight import run_preflight
+
+    ensure_engines()
+    print("\nVOICEVOXをウォームアップ中...")
+    try:
+        run_preflight()
+    except Exception as e:
+        print(f"⚠️  ウォームアップに失敗しました（step4は前回の計測値または既定値で実行します）: {e}")
+
+
+def run_narrate(run):
+    from generate_detailed_narration import generate_narrations, save_narrations
+
+    run.narrations = generate_narrations(run.load_topics())
+    save_narrations(run.narrations, run.summarized_json)
+
+
+def run_audio(run):
+    from generate_audio_from_json import generate_audio_for_articles, generate_audio_streaming
+
+    if run.stream:
+        generate_audio_streaming(str(run.topics_file), str(run.summarized_json), str(run.output_dir),
+                                 topics=run.load_topics())
+    else:
+        narrations = run.load_narrations()
+        generate_audio_for_articles(enumerate(narrations, 1), str(run.output_dir), len(narrations))
+
+
+def run_upload(run):
+    from upload_to_s3 import upload_output_dir
+
+    results = upload_output_dir(str(run.output_dir))
+    run.uploaded_keys = {r['key'] for r in results if r['success']}
+    failed = [r for r in results if not r['success']]
+    if failed:
+        raise PipelineError(f"{len(failed)} 件のアップロードに失敗しました: {failed[0]['error']}")
+
+
+def run_publish(run):
+    from generate_podcast_rss import main as publish_podcast
+
+    # step5を同じプロセスで実行していなければ、step6がS3上の音声を確認する
+    publish_podcast(str(run.output_dir), str(run.summarized_json), uploaded_keys=run.uploaded_keys)
+
+
+# ステップ名: (表示名, 実行する関数, 依存するステップ)
+STAGES = {
+    'fetch': ('Step 1: ニュース検索', run_fetch, []),
+    'voicevox': ('Step 3: VOICEVOX起動確認', run_voicevox, []),
+    'narrate': ('Step 2: ナレーション生成', run_narrate, ['fetch']),
+    'audio': ('Step 4: 音声生成', run_audio, ['narrate', 'voicevox']),
+    'upload': ('Step 5: S3アップロード', run_upload, ['audio']),
+    'publish': ('Step 6: Podcast RSS生成', run_publish, ['upload']),
+}
+
+
+def build_stages(stream=False, only=None):
+    """実行するステップと依存関係（ストリーミングモードではstep2をstep4の中で並行実行する）"""
+    stages = {name: (label, func, list(deps)) for name, (label, func, deps) in STAGES.items()}
+    if stream:
+        del stages['narrate']
+        stages['audio'] = ('Step 2 + 4: ナレーション生成と音声生成（ストリーミング）', run_audio,
+                           ['fetch', 'voicevox'])
+    if only is not None:
+        label, func, _ = stages.get(only, STAGES[only])
+        stages = {only: (label, func, [])}
+    return stages
+
+
+def run_stage(run, label, func):
+    print("==================================")
+    print(f"{label}...")
+    print("==================================")
+    started = time.monotonic()
+    func(run)
+    return time.monotonic() - started
+
+
+def run_dag(run, stages):
+    """
+    依存するステップがすべて完了したステップから順に並行実行
+
+    いずれかのステップが失敗した場合は新しいステップを開始せず、
+    実行中のステップの終了を待ってからPipelineErrorを送出する。
+
+    Returns:
+        dict: {ステップ名: 所要時間（秒）}
+    """
+    pending = dict(stages)
+    running = {}
+    timings = {}
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while running or (pending and failure is None):
+            if failure is None:
+                for name in [n for n, (_, _, deps) in pending.items() if all(d in timings for d in deps)]:
+                    label, func, _ = pending.pop(name)
+                    running[executor.submit(run_stage, run, label, func)] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                    print(f"✓ {stages[name][0]} 完了 ({timings[name]:.1f}秒)\n")
+                except Exception as e:
+                    traceback.print_exc()
+                    failure = failure or PipelineError(f"{stages[name][0]} が失敗しました: {e}")
+
+    if failure is not None:
+        raise failure
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSSpeaker パイプライン実行")
+    parser.add_argument('--stream', action='store_true',
+                        help="ナレーション生成（step2）と音声生成（step4）を並行実行する")
+    parser.add_argument('--stage', choices=list(STAGES),
+                        help="指定したステップだけを実行する（デバッグ用、入力は --run-id の実行ディレクトリから読む）")
+    parser.add_argument('--run-id', help="実行ディレクトリ名（YYYYMMDD_HHMMSS、省略時は現在時刻）")
+    args = parser.parse_args()
+
+    if args.stage in ('narrate', 'audio', 'upload', 'publish') and not args.run_id:
+        parser.error(f"--stage {args.stage} には入力のある実行ディレクトリを --run-id で指定してください")
+
+    run = PipelineRun(args.run_id or datetime.now().strftime("%Y%m%d_%H%M%S"), stream=args.stream)
+    stages = build_stages(args.stream, args.stage)
+
+    print("==================================")
+    print("RSSpeaker Pipeline Starting...")
+    print("==================================")
+    print(f"Run ID: {run.run_id}")
+    print(f"Stages: {', '.join(stages)}\n")
+
+    started = time.monotonic()
+    try:
+        timings = run_dag(run, stages)
+    except PipelineError as e:
+        print(f"\n✗ {e}")
+        sys.exit(1)
+
+    print("==================================")
+    print("✓ Pipeline Completed!")
+    print("==================================")
+    for name, seconds in timings.items():
+        print(f"  {stages[name][0]}: {seconds:.1f}秒")
+    print(f"  合計: {time.monotonic() - started:.1f}秒")
+
+    if 'upload' in timings:
+        from s3_publisher import public_url
+        print(f"S3: {public_url(run.run_id + '/')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,26 @@
 #!/bin/bash
 # RSSpeaker パイプライン実行
-# 各ステップを順番に実行
+# run_pipeline.py で全ステップを1プロセスで実行する（引数はそのまま渡す）
+#   --stream           ナレーション生成（step2）と音声生成（step4）を並行実行
+#   --stage <名前>     1つのステップだけを実行（fetch / voicevox / narrate / audio / upload / publish）
+#   --run-id <ID>      実行ディレクトリ（data/<ID>、output/<ID>）を指定
 
 set -e
 
-echo "=================================="
-echo "RSSpeaker Pipeline Starting..."
-echo "=================================="
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+cd "$SCRIPT_DIR"
 
-# Step 1: RSS記事取得
-./pipeline/step1_fetch/run.sh || exit 1
-
-# Step 2: Geminiで要約
-./pipeline/step2_summarize/run.sh || exit 1
-
-# Step 3: VOICEVOX起動確認
-./pipeline/step3_voicevox/run.sh || exit 1
-
-# Step 4: 音声ファイル生成
-./pipeline/step4_audio/run.sh || exit 1
-
-# Step 5: S3アップロード
-./pipeline/step5_s3/run.sh || exit 1
-
-# Step 6: Podcast RSSフィード生成
-./pipeline/step6_rss/run.sh || exit 1
-
-echo ""
-echo "=================================="
-echo "✓ Pipeline Completed!"
-echo "=================================="
+# 仮想環境の確認とアクティベート
+if [ ! -d "venv" ]; then
+    echo "✗ 仮想環境が見つかりません"
+    echo "  ./setup.sh を実行してください"
+    exit 1
+fi
 
-# 最新のoutputディレクトリを探す
-LATEST_OUTPUT=$(ls -td output/*/ 2>/dev/null | head -1)
-if [ -n "$LATEST_OUTPUT" ]; then
-    TIMESTAMP=$(basename "$LATEST_OUTPUT")
-    FILE_COUNT=$(find "$LATEST_OUTPUT" -name "*.wav" 2>/dev/null | wc -l)
+source venv/bin/activate
 
-    echo "S3: https://rsspeaker-audio-files.s3.ap-southeast-2.amazonaws.com/${TIMESTAMP}/"
-    echo "Total files: $FILE_COUNT"
-fi
+PIPELINE_EXIT_CODE=0
+python3 -u run_pipeline.py "$@" || PIPELINE_EXIT_CODE=$?
 
-exit 0
+deactivate
+exit $PIPELINE_EXIT_CODE
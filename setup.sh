@@ -10,7 +10,7 @@ echo "=========================================="
 if [ -f /etc/debian_version ]; then
     echo "システムパッケージをインストール中..."
     sudo apt update
-    sudo apt install -y python3-venv python3-pip unzip curl
+    sudo apt install -y python3-venv python3-pip unzip curl ffmpeg
     echo "✓ システムパッケージをインストールしました"
 fi
 